@@ -0,0 +1,281 @@
+# benchmarks/run.py
+"""
+Benchmarks for the sandbox hot paths and start-up. Runs offline on Linux and writes a JSON
+file with per-benchmark percentiles so runs from different revisions can be
+compared:
+
+    python -m benchmarks.run                      # everything, bench_results.json
+    python -m benchmarks.run --only launch,monitor --quick
+    python -m benchmarks.run --compare old.json   # print p50 ratios vs an earlier run
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+BENCHMARKS = {}
+
+
+def benchmark(name):
+    def register(fn):
+        BENCHMARKS[name] = fn
+        return fn
+    return register
+
+
+def percentiles(samples):
+    s = sorted(samples)
+    if not s:
+        return {}
+
+    def pick(p):
+        return s[min(len(s) - 1, int(round(p / 100.0 * (len(s) - 1))))]
+    return {"n": len(s), "min": s[0], "p50": pick(50), "p90": pick(90), "p99": pick(99),
+            "max": s[-1], "mean": sum(s) / len(s)}
+
+
+def _sandbox(workdir, **kw):
+    from sandbox.sandbox_core import Sandbox
+    return Sandbox(lambda line: None, reports_dir=os.path.join(workdir, "reports"), **kw)
+
+
+# ---------- launch latency ----------
+@benchmark("launch")
+def bench_launch(workdir, quick):
+    """Session launch -> process started, -> first output delivered, -> session finished.
+    The child stays alive briefly after printing so first-output latency is not
+    hidden by the flush at EOF."""
+    runs = 20 if quick else 100
+    to_start, to_output, to_exit = [], [], []
+    first = threading.Event()
+    sb = _sandbox(workdir, batch_callback=lambda batch: first.set())
+    for _ in range(runs):
+        first.clear()
+        started = []
+        t0 = time.perf_counter()
+        session = sb.new_session("echo ready; sleep 0.05")
+        th = threading.Thread(target=sb.execute, args=(session,),
+                              kwargs={"start_callback": lambda s: started.append(time.perf_counter())})
+        th.start()
+        first.wait(10)
+        t_out = time.perf_counter()
+        session.wait(10)
+        t_exit = time.perf_counter()
+        th.join()
+        to_start.append((started[0] - t0) * 1000)
+        to_output.append((t_out - t0) * 1000)
+        to_exit.append((t_exit - t0) * 1000)
+    return {"unit": "ms", "to_start": percentiles(to_start), "to_first_output": percentiles(to_output),
+            "to_exit": percentiles(to_exit)}
+
+
+# ---------- output throughput ----------
+LINE_CHILD = "import sys\nw=sys.stdout.write\ne=sys.stderr.write\nfor i in range({n}):\n    w('out line %d\\n' % i)\n    e('err line %d\\n' % i)\n"
+BINARY_CHILD = "import os,sys\nb=os.urandom(65536)\nfor i in range({n}):\n    sys.stdout.buffer.write(b)\n    sys.stderr.buffer.write(b)\n"
+
+
+@benchmark("throughput")
+def bench_throughput(workdir, quick):
+    """Sustained stdout+stderr pumping for line-heavy and binary-heavy children."""
+    repeats = 2 if quick else 5
+    results = {}
+    for kind, template, n in (("lines", LINE_CHILD, 100000 if quick else 500000),
+                              ("binary", BINARY_CHILD, 64 if quick else 256)):
+        script = os.path.join(workdir, f"child_{kind}.py")
+        with open(script, "w") as f:
+            f.write(template.format(n=n))
+        mb_s, lines_s, secs = [], [], []
+        for _ in range(repeats):
+            counted = [0]
+            sb = _sandbox(workdir, batch_callback=lambda batch: counted.__setitem__(0, counted[0] + len(batch)))
+            session = sb.new_session(f'"{sys.executable}" "{script}"')
+            t0 = time.perf_counter()
+            sb.execute(session)
+            dt = time.perf_counter() - t0
+            size = os.path.getsize(session.log_path)
+            secs.append(dt)
+            mb_s.append(size / dt / 1e6)
+            lines_s.append(counted[0] / dt)
+            os.remove(session.log_path)
+        results[kind] = {"seconds": percentiles(secs), "MB_per_s": percentiles(mb_s),
+                         "lines_per_s": percentiles(lines_s)}
+    return results
+
+
+# ---------- monitor sampling cost ----------
+@benchmark("monitor")
+def bench_monitor(workdir, quick):
+    """Cost of one ResourceMonitor pass as the number of tracked pids grows."""
+    from sandbox.resource_monitor import ResourceMonitor
+    sizes = (1, 10, 100) if quick else (1, 10, 100, 500)
+    passes = 10 if quick else 30
+    results = {}
+    for k in sizes:
+        procs = [subprocess.Popen(["sleep", "300"]) for _ in range(k)]
+        try:
+            mon = ResourceMonitor(None)
+            for p in procs:
+                mon.track(p.pid)
+            costs = []
+            for _ in range(passes):
+                t0 = time.perf_counter()
+                mon.publish(mon.sample())
+                costs.append((time.perf_counter() - t0) * 1000)
+            results[str(k)] = percentiles(costs)
+            results[str(k)]["per_pid_ms"] = results[str(k)]["p50"] / k
+        finally:
+            for p in procs:
+                p.kill()
+                p.wait()
+    return {"unit": "ms per pass", "by_tracked_pids": results}
+
+
+# ---------- PDF export ----------
+@benchmark("export")
+def bench_export(workdir, quick):
+    """export_report_pdf time against log size (streamed from disk)."""
+    from utils.pdf_exporter import export_report_pdf
+    sizes = (1000, 10000) if quick else (1000, 10000, 100000)
+    repeats = 2 if quick else 3
+    results = {}
+    for n in sizes:
+        log_path = os.path.join(workdir, f"log_{n}.txt")
+        with open(log_path, "w") as f:
+            for i in range(n):
+                f.write(f"[{i:08d}] some typical sandbox output line with a few words and numbers {i * 7}\n")
+        secs = []
+        for _ in range(repeats):
+            out = os.path.join(workdir, f"report_{n}.pdf")
+            t0 = time.perf_counter()
+            export_report_pdf(out, {"PID": 1, "Command": "bench"}, log_path=log_path)
+            secs.append(time.perf_counter() - t0)
+            os.remove(out)
+        results[str(n)] = dict(percentiles(secs), log_bytes=os.path.getsize(log_path))
+    return {"unit": "s", "by_log_lines": results}
+
+
+# ---------- start-up ----------
+STARTUP_PROBE = (
+    "import json, sys\n"
+    "from utils.startup import timeline\n"
+    "import {module}\n"
+    "timeline.mark('imports')\n"
+    "heavy = [m for m in ('matplotlib', 'reportlab', 'numpy') if m in sys.modules]\n"
+    "print(json.dumps({{'timeline': timeline.as_dict(), 'heavy': heavy}}))\n"
+)
+
+
+def _has_display():
+    return os.name == "nt" or bool(os.environ.get("DISPLAY") or os.environ.get("WAYLAND_DISPLAY"))
+
+
+@benchmark("startup")
+def bench_startup(workdir, quick):
+    """Fresh-interpreter start-up: import cost of the GUI and the headless batch entry
+    (and which heavy modules they pull in eagerly), plus the GUI's window-shown,
+    first-sample and chart-ready milestones when a display is available."""
+    runs = 5 if quick else 20
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    results = {}
+    for name, module in (("gui_import", "gui.app_gui"), ("headless_import", "sandbox.batch_runner")):
+        marks, heavy = {}, set()
+        for _ in range(runs):
+            out = subprocess.check_output([sys.executable, "-c", STARTUP_PROBE.format(module=module)], cwd=root)
+            data = json.loads(out)
+            heavy.update(data["heavy"])
+            for mark, ms in data["timeline"].items():
+                marks.setdefault(mark, []).append(ms)
+        results[name] = {mark: percentiles(v) for mark, v in marks.items()}
+        results[name]["eager_heavy_modules"] = sorted(heavy)
+    if _has_display():
+        marks = {}
+        report = os.path.join(workdir, "startup.json")
+        for _ in range(runs):
+            subprocess.run([sys.executable, "main.py", "--startup-report", report, "--exit-after-startup"],
+                           cwd=root, timeout=60, check=True)
+            with open(report) as f:
+                for mark, ms in json.load(f).items():
+                    marks.setdefault(mark, []).append(ms)
+        results["gui_window"] = {mark: percentiles(v) for mark, v in marks.items()}
+    else:
+        results["gui_window"] = {"skipped": "no display"}
+    return dict(results, unit="ms since process creation")
+
+
+def _git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL,
+                                       cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except Exception:
+        return None
+
+
+def _p50s(node, prefix=""):
+    # flatten {..., "p50": x} leaves into {"path": x} for comparisons
+    out = {}
+    if isinstance(node, dict):
+        if "p50" in node:
+            out[prefix] = node["p50"]
+        for k, v in node.items():
+            if isinstance(v, dict):
+                out.update(_p50s(v, f"{prefix}.{k}" if prefix else k))
+    return out
+
+
+def compare(old, new):
+    old_p, new_p = _p50s(old.get("results", {})), _p50s(new.get("results", {}))
+    print(f"{'benchmark':60} {'old p50':>12} {'new p50':>12} {'ratio':>7}")
+    for key in sorted(set(old_p) & set(new_p)):
+        ratio = new_p[key] / old_p[key] if old_p[key] else float("nan")
+        print(f"{key:60} {old_p[key]:12.4f} {new_p[key]:12.4f} {ratio:7.2f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.run", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--only", help="comma-separated subset of: " + ", ".join(BENCHMARKS))
+    parser.add_argument("--quick", action="store_true", help="fewer repeats and smaller inputs")
+    parser.add_argument("-o", "--output", default="bench_results.json")
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    args = parser.parse_args(argv)
+
+    names = args.only.split(",") if args.only else list(BENCHMARKS)
+    unknown = [n for n in names if n not in BENCHMARKS]
+    if unknown:
+        parser.error(f"unknown benchmark(s): {', '.join(unknown)}")
+    report = {
+        "revision": _git_revision(),
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "quick": args.quick,
+        "results": {},
+    }
+    workdir = tempfile.mkdtemp(prefix="sandbox_bench_")
+    try:
+        for name in names:
+            print(f"[bench] {name} ...", file=sys.stderr, flush=True)
+            t0 = time.perf_counter()
+            report["results"][name] = BENCHMARKS[name](workdir, args.quick)
+            print(f"[bench] {name} done in {time.perf_counter() - t0:.1f}s", file=sys.stderr)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"[bench] results written to {args.output}", file=sys.stderr)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), report)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
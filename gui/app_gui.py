@@ -3,31 +3,59 @@ import tkinter as tk
 from tkinter import ttk, filedialog, messagebox, simpledialog
 import psutil
 import os
-import threading
+import sys
 import time
-import matplotlib
-matplotlib.use("Agg")  # for PNG rendering offscreen
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+import queue
 
-from sandbox.sandbox_core import Sandbox
+from sandbox.sandbox_core import Sandbox, CALLBACK_QUEUE_DEPTH
+from sandbox.stream_pump import STDOUT
+from sandbox.zygote import Zygote
 from sandbox.resource_monitor import ResourceMonitor
 from sandbox.restriction_manager import RestrictionManager
 from sandbox.process_control import ProcessControl
-from utils.pdf_exporter import export_report_pdf
+from sandbox.rule_engine import RuleEngine, load_rules
+from sandbox.affinity_scheduler import AffinityScheduler
+from sandbox.metrics_store import MetricsStore, SYSTEM
+from sandbox.log_sink import LogBudget, LogRetention
+from sandbox.session_summary import format_summary
+from utils.startup import timeline
+
+# matplotlib (chart) and reportlab (PDF export) are imported on first use:
+# together they cost far more than the rest of start-up
 
 class SandboxApp:
-    def __init__(self, root):
+    CHART_SAMPLES = 60      # samples shown in the live chart
+    LOG_DRAIN_MS = 100      # how often queued log lines are flushed into the widget
+    LOG_IDLE_MS = 250       # drain interval while nothing is arriving
+    EXPORT_MAX_LINES = 200000   # log lines rendered into a PDF report
+    RULES_FILE = "rules.json"   # optional automatic rules for launched/attached processes
+    # a runaway child cannot fill the disk: per-session log budget, and reports/ kept bounded
+    LOG_BUDGET = {"max_bytes": 256 * 1024 ** 2, "segment_bytes": 64 * 1024 ** 2, "policy": "drop_middle"}
+    LOG_RETENTION = {"max_total_bytes": 2 * 1024 ** 3, "max_age_days": 30}
+
+    def __init__(self, root, max_log_lines=5000):
         self.root = root
         self.root.title("Process Sandboxing - Final Phase")
         self.root.geometry("980x680")
         self.root.configure(bg="#f0f0f0")
 
+        # log lines and UI updates arrive from worker threads; only the Tk thread touches widgets
+        self.max_log_lines = max_log_lines
+        self._log_queue = queue.SimpleQueue()
+        self._ui_queue = queue.SimpleQueue()    # (fn, args) to run on the Tk thread, see _call_soon
+
         # subsystems
         self.restrict = RestrictionManager()
-        self.sandbox = Sandbox(self.append_output)
-        self.monitor = ResourceMonitor(self.system_callback, self.process_callback, poll_interval=1.0)
+        self.sandbox = Sandbox(self.append_output, batch_callback=self.append_batch,
+                               event_callback=self.session_event,
+                               log_budget=LogBudget.from_dict(self.LOG_BUDGET),
+                               retention=LogRetention.from_dict(self.LOG_RETENTION))
+        self.metrics = MetricsStore()
+        self.monitor = ResourceMonitor(None, self.process_callback, poll_interval=1.0,
+                                       batch_callback=self.batch_callback, store=self.metrics)
         self.proc_control = ProcessControl()
+        self.rules = RuleEngine(self._load_rules(), event_callback=self.rule_event)
+        self.scheduler = AffinityScheduler()
 
         # data
         self.proc_psutil = None
@@ -35,14 +63,16 @@ class SandboxApp:
         self.proc_pid = None
         self.proc_priority = "Below Normal"
         self.proc_affinity = []
+        self.proc_session = None    # SandboxSession of the attached process, if launched here
+        self.last_summary = None    # run summary of the latest finished session (for the report)
 
         # UI
         self._build_ui()
-        self._chart_data_init()
-        # start monitor (it will not call process_callback until attached)
+        self.root.after(self.LOG_DRAIN_MS, self._drain_log)
+        # the monitor is the only sampler: labels, chart and export all read its samples
+        self.monitor.subscribe(self._on_sample)
+        self.monitor.subscribe(self.rules.on_sample)
         self.monitor.start()
-        # start chart updater loop
-        self._start_chart_thread()
 
     def _build_ui(self):
         top = ttk.Frame(self.root, padding=8)
@@ -55,6 +85,18 @@ class SandboxApp:
         ttk.Button(top, text="Browse", command=self.browse_file).grid(row=0, column=5, padx=6)
         ttk.Button(top, text="Run", command=self.run_cmd).grid(row=0, column=6, padx=6)
         ttk.Button(top, text="Attach by PID", command=self.attach_by_pid).grid(row=0, column=7, padx=6)
+        self.fork_server_var = tk.IntVar(value=0)
+        ttk.Checkbutton(top, text="Fast .py launch", variable=self.fork_server_var,
+                        command=self.toggle_fork_server).grid(row=1, column=1, sticky="w", padx=6)
+        # off by default: placement pins a launch to the chosen number of cores only
+        self.auto_affinity_var = tk.IntVar(value=0)
+        ttk.Checkbutton(top, text="Auto affinity", variable=self.auto_affinity_var).grid(row=1, column=2, sticky="w",
+                                                                                        padx=6)
+        total = psutil.cpu_count(logical=True) or 1
+        self.auto_cores_var = tk.IntVar(value=total)
+        ttk.Label(top, text="cores:").grid(row=1, column=3, sticky="e")
+        ttk.Spinbox(top, from_=1, to=total, width=4, textvariable=self.auto_cores_var).grid(row=1, column=4,
+                                                                                           sticky="w", padx=2)
 
         # left: details + controls
         left = ttk.LabelFrame(self.root, text="Process", padding=8)
@@ -102,16 +144,14 @@ class SandboxApp:
         right = ttk.LabelFrame(self.root, text="Live & Actions", padding=8)
         right.place(x=480, y=70, width=480, height=560)
 
-        # chart area (matplotlib)
-        self.fig, self.ax = plt.subplots(figsize=(5,2.2), dpi=100)
-        self.ax.set_ylim(0,100)
-        self.ax.set_ylabel("Usage %")
-        self.ax.set_xlabel("samples")
-        self.line_cpu, = self.ax.plot([], [], label="CPU")
-        self.line_mem, = self.ax.plot([], [], label="Memory")
-        self.ax.legend()
-        self.canvas = FigureCanvasTkAgg(self.fig, master=right)
-        self.canvas.get_tk_widget().pack(padx=4, pady=4)
+        # chart area: a fixed-size placeholder, filled by _build_chart once the window is up
+        self.chart_frame = ttk.Frame(right, width=500, height=220)
+        self.chart_frame.pack_propagate(False)
+        self.chart_frame.pack(padx=4, pady=4)
+        self.canvas = None
+        self._chart_bg = None
+        self._chart_last_ts = None
+        self.root.bind("<Map>", self._on_first_map, add="+")
 
         # network toggle
         net_frame = ttk.Frame(right)
@@ -123,7 +163,10 @@ class SandboxApp:
         # export PDF button
         pdf_frame = ttk.Frame(right)
         pdf_frame.pack(pady=6)
-        ttk.Button(pdf_frame, text="Export Report to PDF", command=self.export_pdf).pack()
+        ttk.Button(pdf_frame, text="Export Report to PDF", command=self.export_pdf).pack(side="left")
+        self.export_var = tk.StringVar(value="")
+        ttk.Label(pdf_frame, textvariable=self.export_var).pack(side="left", padx=6)
+        self._export_running = False
 
         # log textbox
         log_frame = ttk.LabelFrame(right, text="Log")
@@ -158,6 +201,20 @@ class SandboxApp:
             else:
                 self.cmd_var.set(f'"{path}"')
 
+    def toggle_fork_server(self):
+        # python "script.py" commands are forked from a pre-warmed interpreter
+        if self.fork_server_var.get():
+            if not Zygote.supported():
+                self.fork_server_var.set(0)
+                messagebox.showwarning("Not supported", "The Python fork-server needs a POSIX system.")
+                return
+            self.sandbox.zygote = Zygote().start()
+            self.append_output("[Fork-server] started")
+        elif self.sandbox.zygote is not None:
+            self.sandbox.zygote.close()
+            self.sandbox.zygote = None
+            self.append_output("[Fork-server] stopped")
+
     def run_cmd(self):
         cmd = self.cmd_var.get().strip()
         if not cmd:
@@ -165,24 +222,77 @@ class SandboxApp:
             return
         self.append_output(f"[Running] {cmd}")
         self.proc_cmd = cmd
-        self.sandbox.run_command(cmd)
-        # small delay to pick up process - we read sandbox.current_log to find pid; safer: attach by pid manually
-        time.sleep(0.2)
-        # user should use Attach by PID for process-specific control (we leave attach explicit)
-        self.status_var.set("Running (launched)")
+        # launch returns once the process exists: attach to it before its first sample
+        session = self.sandbox.launch(cmd, exit_callback=self._session_exited,
+                                      done_callback=self._session_done)
+        if session.pid is None:
+            self.status_var.set("Launch failed")
+            return
+        try:
+            self._attach(psutil.Process(session.pid), session)
+            if self.auto_affinity_var.get():
+                self._show_affinity(self.scheduler.place(session.pid, self._auto_cores()))
+            self.status_var.set("Running")
+        except psutil.NoSuchProcess:
+            self.status_var.set("Finished")
+
+    def _session_exited(self, session):
+        # exit watcher thread: hand over to Tk
+        self._call_soon(self._on_session_exit, session)
+
+    def _on_session_exit(self, session):
+        self.rules.unwatch(session.pid)
+        # cores freed by this session go to others that were sharing
+        for pid, cores in self.scheduler.release(session.pid).items():
+            self.append_output(f"[Affinity] PID {pid} moved to {cores}")
+        if self.proc_pid == session.pid:
+            self.monitor.detach_process()
+            self.proc_control.clear_process()
+            self.proc_psutil = None
+            self.status_var.set(f"Exited ({session.process.returncode})")
+
+    def _session_done(self, session):
+        # session thread, after the log is closed and the summary built
+        self._call_soon(self._on_session_done, session)
+
+    def _on_session_done(self, session):
+        if not session.summary:
+            return
+        self.last_summary = session.summary
+        self.append_output("[Summary] " + "; ".join(f"{label}: {text}"
+                                                    for label, text in format_summary(session.summary)))
+
+    def _attach(self, p, session=None):
+        if self.proc_pid is not None:
+            self.rules.unwatch(self.proc_pid)
+        self.proc_session = session
+        self.proc_psutil = p
+        self.proc_pid = p.pid
+        self.proc_control.set_process(p)
+        self.monitor.attach_process(p)
+        self.pid_var.set(str(self.proc_pid))
+        self.append_output(f"[Attached] PID {self.proc_pid} ({p.name()})")
+        if self.rules.rules:
+            self.rules.watch(p.pid, session=session)
+
+    def _auto_cores(self):
+        try:
+            return max(1, int(self.auto_cores_var.get()))
+        except (tk.TclError, ValueError):
+            return psutil.cpu_count(logical=True) or 1
+
+    def _show_affinity(self, cores):
+        self.proc_affinity = cores
+        for i, v in enumerate(self.core_vars):
+            v.set(1 if i in cores else 0)
+        self.append_output(f"[Affinity] auto-placed on {cores}")
 
     def attach_by_pid(self):
         ans = simpledialog.askinteger("Attach by PID", "Enter PID to attach:")
         if not ans:
             return
         try:
-            p = psutil.Process(ans)
-            self.proc_psutil = p
-            self.proc_pid = p.pid
-            self.proc_control.set_process(p)
-            self.monitor.attach_process(p)
-            self.pid_var.set(str(self.proc_pid))
-            self.append_output(f"[Attached] PID {self.proc_pid} ({p.name()})")
+            self._attach(psutil.Process(ans))
             self.status_var.set("Attached")
         except Exception as e:
             messagebox.showerror("Attach failed", str(e))
@@ -207,6 +317,7 @@ class SandboxApp:
             return
         try:
             self.proc_control.set_affinity(cores)
+            self.scheduler.pin(self.proc_pid, cores, apply=False)
             self.proc_affinity = cores
             self.append_output(f"[Affinity] set to {cores}")
         except Exception as e:
@@ -223,60 +334,158 @@ class SandboxApp:
         except Exception as e:
             messagebox.showerror("Kill failed", str(e))
 
-    # ---------- monitor callbacks ----------
-    def system_callback(self, cpu, mem):
-        # update small status labels for system usage if needed
-        # not displayed directly in main UI aside from chart
-        pass
-
+    # ---------- monitor callbacks (monitor thread) ----------
     def process_callback(self, proc_cpu, proc_mem):
-        self.cpu_var.set(f"{proc_cpu:.1f}%")
-        self.mem_var.set(f"{proc_mem:.1f}%")
-        try:
-            if self.proc_psutil:
-                rss = self.proc_psutil.memory_info().rss
-                self.rss_var.set(f"{rss//1024} KB")
-        except Exception:
-            pass
+        self._call_soon(self.cpu_var.set, f"{proc_cpu:.1f}%")
+        self._call_soon(self.mem_var.set, f"{proc_mem:.1f}%")
+
+    def batch_callback(self, readings):
+        # attached process is tracked as a tree: show RSS summed over its descendants
+        r = readings.get(self.proc_pid)
+        if r:
+            session = self.proc_session
+            if session is not None and session.pid == r["pid"]:
+                session.record_sample(r)
+            extra = f" ({r['procs']} procs)" if r.get("procs", 1) > 1 else ""
+            self._call_soon(self.rss_var.set, f"{r['rss']//1024} KB{extra}")
 
     # ---------- output log ----------
     def append_output(self, text):
+        # safe from any thread: queued and inserted by _drain_log on the Tk thread
         ts = time.strftime("%H:%M:%S")
-        self.log_text.insert("end", f"[{ts}] {text}\n")
-        self.log_text.see("end")
+        self._log_queue.put(f"[{ts}] {text}\n")
+        CALLBACK_QUEUE_DEPTH.inc(queue="gui_log")
+
+    def append_batch(self, batch):
+        # sandbox output batches: [(timestamp, stream, line), ...]
+        self._log_queue.put("".join(
+            f"[{time.strftime('%H:%M:%S', time.localtime(ts))}] {'' if stream == STDOUT else 'ERR: '}{line}\n"
+            for ts, stream, line in batch))
+        CALLBACK_QUEUE_DEPTH.inc(queue="gui_log")
+
+    def session_event(self, session, event):
+        detail = ", ".join(f"{k}={v}" for k, v in event.items() if k not in ("type", "ts", "session_id"))
+        self.append_output(f"[Event] {event['type']} {detail}")
+
+    def rule_event(self, event):
+        # rules on a pid attached without a session
+        self.append_output(f"[Rule] {event['rule']} -> {event['action']} on PID {event['pid']}"
+                           + (f" ({event['error']})" if event.get("error") else ""))
+
+    def _load_rules(self):
+        if not os.path.exists(self.RULES_FILE):
+            return []
+        try:
+            return load_rules(self.RULES_FILE)
+        except (OSError, ValueError, KeyError) as e:
+            self.append_output(f"[Rules] {self.RULES_FILE} not loaded: {e}")
+            return []
 
-    # ---------- chart logic ----------
-    def _chart_data_init(self):
-        self.chart_cpu = []
-        self.chart_mem = []
+    def _call_soon(self, fn, *args):
+        # safe from any thread, before or during mainloop: run by _drain_log on the Tk thread
+        self._ui_queue.put((fn, args))
 
-    def _start_chart_thread(self):
-        def loop():
+    def _run_ui_calls(self):
+        calls = 0
+        try:
             while True:
-                # append latest system metrics
+                fn, args = self._ui_queue.get_nowait()
+                calls += 1
                 try:
-                    cpu = psutil.cpu_percent(interval=0.5)
-                    mem = psutil.virtual_memory().percent
+                    fn(*args)
                 except Exception:
-                    cpu, mem = 0.0, 0.0
-                self.chart_cpu.append(cpu)
-                self.chart_mem.append(mem)
-                if len(self.chart_cpu) > 60:
-                    self.chart_cpu.pop(0); self.chart_mem.pop(0)
-                # update plot on main thread via after
-                self.root.after(0, self._update_plot)
-                time.sleep(1)
-        threading.Thread(target=loop, daemon=True).start()
+                    self.root.report_callback_exception(*sys.exc_info())
+        except queue.Empty:
+            pass
+        return calls
+
+    def _drain_log(self):
+        # Tk-side timer; worker threads only ever touch the queues
+        calls = self._run_ui_calls()
+        chunks = []
+        try:
+            while True:
+                chunks.append(self._log_queue.get_nowait())
+        except queue.Empty:
+            pass
+        CALLBACK_QUEUE_DEPTH.dec(len(chunks), queue="gui_log")
+        if chunks:
+            text = "".join(chunks)
+            # a flood bigger than the view is cut down before it reaches Tk
+            lines = text.splitlines(keepends=True)
+            if len(lines) > self.max_log_lines:
+                skipped = len(lines) - self.max_log_lines
+                text = f"[... {skipped} lines not shown, see log file ...]\n" + "".join(lines[skipped:])
+            self.log_text.insert("end", text)
+            excess = int(self.log_text.index("end-1c").split(".")[0]) - 1 - self.max_log_lines
+            if excess > 0:
+                self.log_text.delete("1.0", f"{excess + 1}.0")
+            self.log_text.see("end")
+        # an empty queue costs one get_nowait per tick; back off to the idle rate meanwhile
+        self.root.after(self.LOG_DRAIN_MS if chunks or calls else self.LOG_IDLE_MS, self._drain_log)
+
+    # ---------- chart logic ----------
+    def _on_sample(self, sample):
+        timeline.mark("first sample")
+        # monitor thread: hand the redraw to Tk
+        self._call_soon(self._update_plot)
+
+    def _on_first_map(self, event):
+        if event.widget is self.root and not timeline.has("window shown"):
+            timeline.mark("window shown")
+            # let Tk paint the window before matplotlib is imported
+            self.root.after(0, self._build_chart)
+
+    def _build_chart(self):
+        # matplotlib: fixed axes, lines blitted over a cached background
+        self.root.update_idletasks()
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+        self.fig = Figure(figsize=(5,2.2), dpi=100)
+        self.ax = self.fig.add_subplot()
+        self.ax.set_xlim(0, self.CHART_SAMPLES - 1)
+        self.ax.set_ylim(0,100)
+        self.ax.set_ylabel("Usage %")
+        self.ax.set_xlabel("samples")
+        self.line_cpu, = self.ax.plot([], [], label="CPU", animated=True)
+        self.line_mem, = self.ax.plot([], [], label="Memory", animated=True)
+        self.ax.legend()
+        self.canvas = FigureCanvasTkAgg(self.fig, master=self.chart_frame)
+        self.canvas.get_tk_widget().pack(fill="both", expand=True)
+        self.canvas.mpl_connect("draw_event", self._on_chart_draw)
+        self._chart_last_ts = None
+        self._update_plot()
+        timeline.mark("chart ready")
+        self.append_output(f"[Startup] {timeline.summary()}")
+
+    def _on_chart_draw(self, event):
+        # full redraw (first show, resize): re-cache everything but the lines
+        self._chart_bg = self.canvas.copy_from_bbox(self.fig.bbox)
+        self._blit_lines(blit=False)
 
     def _update_plot(self):
-        xs = list(range(len(self.chart_cpu)))
-        self.line_cpu.set_data(xs, self.chart_cpu)
-        self.line_mem.set_data(xs, self.chart_mem)
-        if len(xs) == 0:
-            return
-        self.ax.set_xlim(0, max(30, len(xs)))
-        self.ax.set_ylim(0, max(100, max(self.chart_cpu + [0])))
-        self.canvas.draw_idle()
+        if self.canvas is None:
+            return      # chart not built yet
+        ts, chart_cpu = self.metrics.raw(SYSTEM, "cpu")
+        if not ts or ts[-1] == self._chart_last_ts:
+            return      # nothing new since the last redraw
+        self._chart_last_ts = ts[-1]
+        chart_cpu = chart_cpu[-self.CHART_SAMPLES:]
+        chart_mem = self.metrics.raw(SYSTEM, "mem")[1][-self.CHART_SAMPLES:]
+        self.line_cpu.set_data(range(len(chart_cpu)), chart_cpu)
+        self.line_mem.set_data(range(len(chart_mem)), chart_mem)
+        if self._chart_bg is None:
+            self.canvas.draw()      # the draw_event handler caches the background
+        else:
+            self._blit_lines()
+
+    def _blit_lines(self, blit=True):
+        if blit:
+            self.canvas.restore_region(self._chart_bg)
+        self.ax.draw_artist(self.line_cpu)
+        self.ax.draw_artist(self.line_mem)
+        if blit:
+            self.canvas.blit(self.fig.bbox)
 
     # ---------- network toggle ----------
     def toggle_network(self):
@@ -287,24 +496,12 @@ class SandboxApp:
 
     # ---------- export to PDF ----------
     def export_pdf(self):
-        # create small chart image first
+        # chart PNG is rendered with the report, off the Tk thread, from the full
+        # stored history (rolled up for long sessions)
         chart_img = os.path.join("reports", "chart.png")
         os.makedirs("reports", exist_ok=True)
-        try:
-            # save chart as PNG
-            fig2, ax2 = plt.subplots(figsize=(6,2), dpi=150)
-            ax2.plot(self.chart_cpu, label="CPU")
-            ax2.plot(self.chart_mem, label="Memory")
-            ax2.set_ylim(0, 100)
-            ax2.legend()
-            ax2.set_title("System Usage History")
-            fig2.tight_layout()
-            fig2.savefig(chart_img)
-            fig2.clf()
-            plt.close(fig2)
-        except Exception as e:
-            self.append_output(f"[Export] chart save failed: {e}")
-            chart_img = None
+        chart_series = [("CPU",) + tuple(self.metrics.history(SYSTEM, "cpu")),
+                        ("Memory",) + tuple(self.metrics.history(SYSTEM, "mem"))]
 
         # prepare metadata & logs
         metadata = {
@@ -313,12 +510,40 @@ class SandboxApp:
             "Priority": self.proc_priority,
             "Affinity": str(self.proc_affinity),
         }
-        log_text = self.log_text.get("1.0", "end").strip()
+        for label, text in format_summary(self.last_summary):
+            metadata[label] = text
+        # stream the session's log file from disk; fall back to the on-screen log
+        log_path = self.sandbox.get_current_log()
+        if log_path and os.path.exists(log_path):
+            log_text = None
+            metadata["Log file"] = log_path
+        else:
+            log_path = None
+            log_text = self.log_text.get("1.0", "end").strip()
         pdf_name = f"reports/sandbox_report_{int(time.time())}.pdf"
-        try:
-            export_report_pdf(pdf_name, metadata, log_text, chart_img)
-            self.append_output(f"[Export] PDF saved: {pdf_name}")
-            messagebox.showinfo("Exported", f"Report exported to {pdf_name}")
-        except Exception as e:
-            messagebox.showerror("Export failed", str(e))
-
+        if self._export_running:
+            messagebox.showwarning("Export running", "A PDF export is already in progress.")
+            return
+        self._export_running = True
+        self.export_var.set("Exporting... 0%")
+        from utils.pdf_exporter import export_report_pdf_async
+        export_report_pdf_async(pdf_name, metadata, log_text, chart_img, log_path=log_path,
+                                max_lines=self.EXPORT_MAX_LINES,
+                                progress_callback=self._export_progress,
+                                done_callback=self._export_done, chart_series=chart_series)
+
+    def _export_progress(self, fraction):
+        # worker thread: only hand the value to Tk
+        self._call_soon(self.export_var.set, f"Exporting... {int(fraction * 100)}%")
+
+    def _export_done(self, path, error):
+        def finish():
+            self._export_running = False
+            if error is not None:
+                self.export_var.set("")
+                messagebox.showerror("Export failed", str(error))
+                return
+            self.export_var.set("")
+            self.append_output(f"[Export] PDF saved: {path}")
+            messagebox.showinfo("Exported", f"Report exported to {path}")
+        self._call_soon(finish)
@@ -1,11 +1,39 @@
 # main.py
-import tkinter as tk
-from gui.app_gui import SandboxApp
+from utils.startup import timeline
+import sys
+
 
 def main():
+    # headless entry: python main.py batch manifest.json (no Tk needed)
+    if len(sys.argv) > 1 and sys.argv[1] == "batch":
+        from sandbox.batch_runner import main as batch_main
+        return batch_main(sys.argv[2:])
+    # --startup-report FILE writes the start-up timeline once the chart is up;
+    # --exit-after-startup then closes the window (used by the startup benchmark)
+    args = sys.argv[1:]
+    report = args[args.index("--startup-report") + 1] if "--startup-report" in args[:-1] else None
+    exit_after = "--exit-after-startup" in args
+    # --metrics-port PORT serves the app's metrics on localhost (OpenMetrics text at /metrics)
+    if "--metrics-port" in args[:-1]:
+        from utils.instrumentation import metrics
+        metrics.serve(int(args[args.index("--metrics-port") + 1]))
+    import tkinter as tk
+    from gui.app_gui import SandboxApp
+    timeline.mark("imports")
     root = tk.Tk()
     app = SandboxApp(root)
+    timeline.mark("window built")
+    if report or exit_after:
+        def check_ready():
+            if not timeline.has("chart ready"):
+                root.after(20, check_ready)
+                return
+            if report:
+                timeline.save(report)
+            if exit_after:
+                root.destroy()
+        root.after(20, check_ready)
     root.mainloop()
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
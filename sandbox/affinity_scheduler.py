@@ -0,0 +1,195 @@
+# sandbox/affinity_scheduler.py
+import glob
+import os
+import re
+import threading
+
+import psutil
+
+SYSFS_CPU = "/sys/devices/system/cpu"
+SYSFS_NODE = "/sys/devices/system/node"
+
+
+def parse_cpulist(text):
+    """'0-3,8,10-11' -> [0, 1, 2, 3, 8, 10, 11]"""
+    cpus = []
+    for part in text.strip().split(","):
+        if not part:
+            continue
+        if "-" in part:
+            lo, hi = part.split("-")
+            cpus.extend(range(int(lo), int(hi) + 1))
+        else:
+            cpus.append(int(part))
+    return cpus
+
+
+def _read(path):
+    try:
+        with open(path) as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+class Topology:
+    """
+    Usable logical CPUs grouped into physical cores (SMT siblings) and NUMA
+    nodes, read from sysfs. Without sysfs every CPU is its own core on node 0.
+    """
+    def __init__(self, cpus=None, sysfs_cpu=SYSFS_CPU, sysfs_node=SYSFS_NODE):
+        if cpus is None:
+            cpus = sorted(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") \
+                else list(range(psutil.cpu_count(logical=True) or 1))
+        self.cpus = list(cpus)
+        usable = set(self.cpus)
+        self.core_of = {}           # cpu -> physical core id (lowest sibling)
+        for cpu in self.cpus:
+            siblings = _read(os.path.join(sysfs_cpu, f"cpu{cpu}", "topology", "thread_siblings_list"))
+            self.core_of[cpu] = min(parse_cpulist(siblings)) if siblings else cpu
+        self.node_of = {cpu: 0 for cpu in self.cpus}
+        for path in glob.glob(os.path.join(sysfs_node, "node[0-9]*")):
+            cpulist = _read(os.path.join(path, "cpulist"))
+            node = int(re.search(r"node(\d+)$", path).group(1))
+            for cpu in parse_cpulist(cpulist or ""):
+                if cpu in usable:
+                    self.node_of[cpu] = node
+
+    def siblings(self, cpu):
+        core = self.core_of[cpu]
+        return [c for c in self.cpus if self.core_of[c] == core]
+
+    def nodes(self):
+        out = {}
+        for cpu in self.cpus:
+            out.setdefault(self.node_of[cpu], []).append(cpu)
+        return out
+
+
+class AffinityScheduler:
+    """
+    Chooses CPU affinity for new sandboxed processes. Each CPU is scored by its
+    current load (psutil per-CPU percent since the last call) plus a penalty for
+    every live session already placed on it, and for load on its SMT siblings.
+    A request for n CPUs is kept on one NUMA node when a node has room and
+    spreads over distinct physical cores before doubling up on siblings.
+
+    place() pins a pid (and its children), release() forgets it and moves
+    sessions still sharing CPUs onto the ones that became free.
+    """
+    ASSIGNED_PENALTY = 100.0    # one live session on a CPU weighs as much as a fully busy CPU
+    SIBLING_WEIGHT = 0.5        # load on an SMT sibling slows this CPU down too
+
+    def __init__(self, topology=None):
+        self.topology = topology or Topology()
+        self._assigned = {}     # pid -> [cpus]
+        self._fixed = set()     # pids pinned explicitly; never moved by rebalance()
+        self._lock = threading.Lock()
+        self._load = {cpu: 0.0 for cpu in self.topology.cpus}
+        self.refresh_load()     # prime the per-CPU deltas
+
+    def refresh_load(self):
+        try:
+            per_cpu = psutil.cpu_percent(percpu=True)
+        except Exception:
+            return self._load
+        self._load = {cpu: per_cpu[cpu] if cpu < len(per_cpu) else 0.0 for cpu in self.topology.cpus}
+        return self._load
+
+    def assignments(self):
+        with self._lock:
+            return {pid: list(cpus) for pid, cpus in self._assigned.items()}
+
+    def _scores(self, exclude=None):
+        counts = {cpu: 0 for cpu in self.topology.cpus}
+        for pid, cpus in self._assigned.items():
+            if pid != exclude:
+                for cpu in cpus:
+                    counts[cpu] = counts.get(cpu, 0) + 1
+        scores = {}
+        for cpu in self.topology.cpus:
+            own = self._load.get(cpu, 0.0) + counts[cpu] * self.ASSIGNED_PENALTY
+            sib = sum(self._load.get(s, 0.0) + counts[s] * self.ASSIGNED_PENALTY
+                      for s in self.topology.siblings(cpu) if s != cpu)
+            scores[cpu] = own + self.SIBLING_WEIGHT * sib
+        return scores, counts
+
+    def choose(self, n=1, exclude=None):
+        """The n best CPUs right now (no pinning)."""
+        n = max(1, min(n, len(self.topology.cpus)))
+        scores, _ = self._scores(exclude)
+        nodes = self.topology.nodes()
+        # the node whose best n CPUs are cheapest; nodes too small only if none fits
+        fitting = [cpus for cpus in nodes.values() if len(cpus) >= n] or [self.topology.cpus]
+        best_node = min(fitting, key=lambda cpus: sum(sorted(scores[c] for c in cpus)[:n]))
+        picked, used_cores = [], set()
+        ranked = sorted(best_node, key=lambda c: (scores[c], c))
+        # first pass: one CPU per physical core; second pass fills in siblings
+        for cpu in ranked:
+            if len(picked) < n and self.topology.core_of[cpu] not in used_cores:
+                picked.append(cpu)
+                used_cores.add(self.topology.core_of[cpu])
+        for cpu in ranked:
+            if len(picked) < n and cpu not in picked:
+                picked.append(cpu)
+        return sorted(picked)
+
+    def place(self, pid, n=1):
+        """Pick n CPUs for pid, pin its process tree there and remember the assignment."""
+        with self._lock:
+            self.refresh_load()
+            cpus = self.choose(n, exclude=pid)
+            self._assigned[pid] = cpus
+        self._pin(pid, cpus)
+        return cpus
+
+    def pin(self, pid, cpus, apply=True):
+        """Record an explicit (e.g. user-chosen) affinity so later placements avoid it."""
+        with self._lock:
+            self._assigned[pid] = sorted(cpus)
+            self._fixed.add(pid)
+        if apply:
+            self._pin(pid, cpus)
+
+    def release(self, pid, rebalance=True):
+        with self._lock:
+            freed = self._assigned.pop(pid, None)
+            self._fixed.discard(pid)
+        if freed and rebalance:
+            return self.rebalance()
+        return {}
+
+    def rebalance(self):
+        """Move sessions off CPUs they share with others when a less loaded choice exists."""
+        moved = {}
+        with self._lock:
+            for pid in [p for p in self._assigned if not psutil.pid_exists(p)]:
+                del self._assigned[pid]
+                self._fixed.discard(pid)
+            self.refresh_load()
+            for pid, cpus in list(self._assigned.items()):
+                if pid in self._fixed:
+                    continue
+                _, counts = self._scores(exclude=pid)
+                if not any(counts[c] for c in cpus):
+                    continue        # not sharing with another session
+                better = self.choose(len(cpus), exclude=pid)
+                if sum(counts[c] for c in better) < sum(counts[c] for c in cpus):
+                    self._assigned[pid] = better
+                    moved[pid] = better
+        for pid, cpus in moved.items():
+            self._pin(pid, cpus)
+        return moved
+
+    @staticmethod
+    def _pin(pid, cpus):
+        try:
+            root = psutil.Process(pid)
+            procs = [root] + root.children(recursive=True)
+        except psutil.Error:
+            return
+        for proc in procs:
+            try:
+                proc.cpu_affinity(list(cpus))
+            except (psutil.Error, AttributeError, OSError):
+                pass
@@ -0,0 +1,224 @@
+# sandbox/async_sandbox.py
+import asyncio
+import time
+
+from sandbox.sandbox_core import (Sandbox, ACTIVE_SESSIONS, CALLBACK_QUEUE_DEPTH, LAUNCHES, LAUNCH_FAILURES,
+                                  LAUNCH_SECONDS)
+from sandbox.stream_pump import StreamPump, STDOUT, STDERR
+from sandbox.log_sink import LogSink
+from sandbox.spawn import direct_argv
+
+
+class AsyncSession:
+    """
+    Handle for a sandboxed process running on an asyncio loop.
+    `await session.wait()` gives the exit code; `async for batch in session`
+    yields lists of (timestamp, stream, line) as the child produces them.
+    """
+    _EOF = object()
+
+    def __init__(self, session):
+        self.session = session
+        self.process = None
+        self.timed_out = False
+        self._queue = asyncio.Queue()
+        self._done = asyncio.Event()
+        self._tasks = []
+
+    # the underlying SandboxSession carries id, cwd, log path and status
+    @property
+    def session_id(self):
+        return self.session.session_id
+
+    @property
+    def pid(self):
+        return self.process.pid if self.process else None
+
+    @property
+    def returncode(self):
+        return self.session.returncode
+
+    @property
+    def log_path(self):
+        return self.session.log_path
+
+    async def wait(self, timeout=None):
+        """Wait for the process and its output to finish; returns the exit code."""
+        await asyncio.wait_for(asyncio.shield(self._done.wait()), timeout)
+        return self.session.returncode
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        batch = await self._queue.get()
+        if batch is self._EOF:
+            # leave the sentinel in place so later iterators stop too
+            self._queue.put_nowait(self._EOF)
+            raise StopAsyncIteration
+        # the queue-depth gauge counts every batch put and not yet taken, EOF excluded
+        CALLBACK_QUEUE_DEPTH.dec(queue="async")
+        return batch
+
+    def terminate(self):
+        if self.process and self.process.returncode is None:
+            self.process.terminate()
+
+    def kill(self):
+        if self.process and self.process.returncode is None:
+            self.process.kill()
+
+    async def cancel(self, grace=2.0):
+        """Terminate the child, escalating to kill after `grace` seconds."""
+        self.terminate()
+        try:
+            await asyncio.wait_for(asyncio.shield(self._done.wait()), grace)
+        except asyncio.TimeoutError:
+            self.kill()
+            await self._done.wait()
+        if self.session.status == "finished":
+            self.session.status = "cancelled"
+            self.session.save_metadata()
+        return self.session.returncode
+
+    def __repr__(self):
+        return f"<AsyncSession {self.session_id} {self.session.status} pid={self.pid}>"
+
+
+class AsyncSandbox:
+    """
+    asyncio counterpart of Sandbox.run_command: one event loop can drive many
+    sandboxed processes without a thread each. Sessions, working directories and
+    log files are allocated by the wrapped Sandbox, so both APIs share the same
+    reports/ layout.
+    """
+    def __init__(self, sandbox=None, read_size=64 * 1024, flush_interval=0.25):
+        self.sandbox = sandbox or Sandbox(lambda line: None)
+        self.read_size = read_size
+        self.flush_interval = flush_interval
+
+    async def start(self, command, cwd=None, timeout=None, limits=None):
+        """
+        Launch `command` and return an AsyncSession without waiting for it.
+        Like Sandbox.launch, commands that need no shell are exec'd directly and
+        the rest (pipes, redirections, builtins...) run through the shell.
+        limits (default: the sandbox's) are applied in the child before exec.
+        """
+        session = self.sandbox.new_session(command, cwd=cwd, limits=limits)
+        self.sandbox.acquire_workspace(session)
+        handle = AsyncSession(session)
+        self.sandbox._track_live(session)
+        logf = None
+        t0 = time.perf_counter()
+        try:
+            logf = LogSink(session.log_path, session.log_budget)
+            preexec, session._cgroup = self.sandbox._prepare_limits(session)
+            argv = direct_argv(command, session.cwd)
+            options = dict(cwd=session.cwd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE,
+                           preexec_fn=preexec)
+            if argv:
+                handle.process = await asyncio.create_subprocess_exec(*argv, **options)
+            else:
+                handle.process = await asyncio.create_subprocess_shell(command, **options)
+        except Exception as ex:
+            LAUNCH_FAILURES.inc()
+            if session._cgroup is not None:
+                session._cgroup.remove()
+                session._cgroup = None
+            if logf is not None:
+                logf.close()
+            session.error = ex
+            session._finish("failed")
+            self.sandbox._release_live(session)
+            handle._queue.put_nowait(AsyncSession._EOF)
+            handle._done.set()
+            raise
+        session.process = handle.process
+        session.status = "running"
+        ACTIVE_SESSIONS.inc()
+        LAUNCHES.inc(path="async")
+        LAUNCH_SECONDS.observe(time.perf_counter() - t0, path="async")
+        session.started = time.time()
+        handle._tasks.append(asyncio.ensure_future(self._supervise(handle, logf, timeout)))
+        return handle
+
+    async def run(self, command, cwd=None, timeout=None):
+        """Launch, discard streamed batches (they still reach the log) and return the exit code."""
+        handle = await self.start(command, cwd=cwd, timeout=timeout)
+        async for _ in handle:
+            pass
+        return await handle.wait()
+
+    async def _supervise(self, handle, logf, timeout):
+        ready = []
+        pump = StreamPump(None, None, logf, ready.append, flush_interval=self.flush_interval)
+
+        async def publish():
+            while ready:
+                await handle._queue.put(ready.pop(0))
+                CALLBACK_QUEUE_DEPTH.inc(queue="async")
+
+        async def reader(name, stream):
+            while True:
+                data = await stream.read(self.read_size)
+                if not data:
+                    return
+                pump.feed(name, data)
+                pump.maybe_flush()
+                await publish()
+                delay = logf.throttle()
+                if delay:
+                    # log backpressure: stop reading so the child blocks on its pipe
+                    pump.flush()
+                    await publish()
+                    await asyncio.sleep(min(delay, 1.0))
+
+        async def ticker():
+            # time-based flush while the child is quiet
+            while True:
+                await asyncio.sleep(self.flush_interval)
+                pump.maybe_flush()
+                await publish()
+
+        proc = handle.process
+        session = handle.session
+        status = "failed"
+        tick = asyncio.ensure_future(ticker())
+        try:
+            readers = asyncio.gather(reader(STDOUT, proc.stdout), reader(STDERR, proc.stderr))
+            try:
+                await asyncio.wait_for(asyncio.shield(readers), timeout)
+            except asyncio.TimeoutError:
+                handle.timed_out = True
+                proc.kill()
+                await readers
+            session.returncode = await proc.wait()
+            status = "timeout" if handle.timed_out else "finished"
+        except asyncio.CancelledError:
+            proc.kill()
+            await proc.wait()
+            session.returncode = proc.returncode
+            status = "cancelled"
+            raise
+        except Exception as ex:
+            session.error = ex
+            raise
+        finally:
+            # the same bookkeeping as Sandbox._complete, with the log closed before the session finishes
+            tick.cancel()
+            for name in (STDOUT, STDERR):
+                pump.feed(name, b"", final=True)
+            pump.flush()
+            logf.close()
+            Sandbox._record_log(session, logf)
+            Sandbox._collect_limit_events(session, session._cgroup)
+            if session._cgroup is not None:
+                session._cgroup.remove()
+                session._cgroup = None
+            session._finish(status)
+            self.sandbox._release_live(session)
+            for batch in ready:
+                handle._queue.put_nowait(batch)
+                CALLBACK_QUEUE_DEPTH.inc(queue="async")
+            handle._queue.put_nowait(AsyncSession._EOF)
+            handle._done.set()
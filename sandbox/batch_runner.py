@@ -0,0 +1,267 @@
+# sandbox/batch_runner.py
+import argparse
+import json
+import sys
+import threading
+import time
+
+import psutil
+
+from sandbox.sandbox_core import Sandbox
+from sandbox.session_manager import SessionManager
+from sandbox.resource_monitor import ResourceMonitor
+from sandbox.process_control import ProcessControl
+from sandbox.limits import ResourceLimits
+from sandbox.rule_engine import RuleEngine, Rule, load_rules
+from sandbox.affinity_scheduler import AffinityScheduler
+from sandbox.log_sink import LogBudget, LogRetention
+
+
+def load_manifest(path):
+    """
+    Read a job manifest. Either a JSON object {"concurrency": N, "jobs": [...]},
+    a JSON list of jobs, or NDJSON with one job per line. A job is a command
+    string or {"id", "command", "priority", "affinity", "timeout", "limits", "rules"},
+    where limits holds ResourceLimits fields (cpu_seconds, address_space,
+    open_files, processes, cpu_quota, memory_max) and rules is a list of rule
+    dicts (see sandbox.rule_engine). Top-level "rules" apply to every job
+    without its own. "affinity": "auto" lets the AffinityScheduler place the
+    job on "cores" CPUs (default 1). "log_budget" holds LogBudget fields
+    (max_bytes, max_lines, policy, segment_bytes, ...); a top-level
+    "log_budget" is the default for every job and a top-level "retention"
+    holds LogRetention fields (max_total_bytes, max_age_days, max_sessions).
+    """
+    with (sys.stdin if path == "-" else open(path, encoding="utf-8")) as f:
+        text = f.read()
+    try:
+        data = json.loads(text)
+    except ValueError:
+        data = [json.loads(line) for line in text.splitlines() if line.strip()]
+    settings = {}
+    if isinstance(data, dict):
+        settings = {k: v for k, v in data.items() if k != "jobs"}
+        data = data.get("jobs", [])
+    jobs = []
+    for n, job in enumerate(data, 1):
+        if isinstance(job, str):
+            job = {"command": job}
+        if not job.get("command"):
+            raise ValueError(f"job {n}: missing 'command'")
+        job.setdefault("id", str(n))
+        jobs.append(job)
+    return settings, jobs
+
+
+class BatchRunner:
+    """
+    Headless runner: pushes a list of jobs through a SessionManager, applies
+    per-job priority/affinity via ProcessControl, enforces timeouts, tracks each
+    job's process tree with one shared ResourceMonitor and writes one NDJSON
+    result line per finished job.
+    """
+    def __init__(self, jobs, concurrency=4, out=None, poll_interval=0.5, reports_dir="reports", rules=(),
+                 auto_affinity=False, log_budget=None, retention=None):
+        self.jobs = jobs
+        self.auto_affinity = auto_affinity      # place jobs without an explicit affinity
+        self.scheduler = AffinityScheduler()
+        # fired rules land in the session's events, and so in the job's result
+        self.rules = RuleEngine(rules)
+        self.out = out or sys.stdout
+        self.sandbox = Sandbox(lambda line: None, reports_dir=reports_dir, log_budget=log_budget,
+                               retention=retention)
+        self.manager = SessionManager(self.sandbox, max_workers=concurrency,
+                                      session_callback=self._on_session)
+        self.monitor = ResourceMonitor(None, poll_interval=poll_interval)
+        self.monitor.subscribe(self._on_sample)
+        self.monitor.subscribe(self.rules.on_sample)
+        self.results = []
+        self._by_session = {}       # session_id -> job state
+        self._by_pid = {}           # root pid -> job state
+        self._lock = threading.Lock()
+        self._submit_lock = threading.Lock()
+
+    def run(self):
+        self.monitor.start()
+        try:
+            for job in self.jobs:
+                # a session may start before submit() returns: register it under the lock
+                with self._submit_lock:
+                    limits = ResourceLimits.from_dict(job["limits"]) if job.get("limits") else None
+                    budget = LogBudget.from_dict(job["log_budget"]) if job.get("log_budget") else None
+                    session = self.manager.submit(job["command"], limits=limits, log_budget=budget)
+                    self._by_session[session.session_id] = {
+                        "job": job, "session": session,
+                        "timer": None, "timed_out": False, "warnings": []}
+            self.manager.wait_all()
+        finally:
+            self.manager.shutdown()
+            self.monitor.stop()
+        return self.results
+
+    # ---------- session lifecycle ----------
+    def _on_session(self, session):
+        with self._submit_lock:
+            state = self._by_session.get(session.session_id)
+        if state is None:
+            return
+        if session.is_done():
+            self._finish(state)
+        else:
+            self._start(state)
+
+    def _start(self, state):
+        job, session = state["job"], state["session"]
+        with self._lock:
+            self._by_pid[session.pid] = state
+        try:
+            self.monitor.track(session.pid, tree=True)
+        except psutil.Error:
+            pass    # already gone; the result still reports exit code and wall time
+        rules = job.get("rules")
+        if rules or self.rules.rules:
+            self.rules.watch(session.pid, [Rule.from_dict(r) for r in rules] if rules else None, session)
+        if job.get("affinity") == "auto" or (self.auto_affinity and not job.get("affinity")):
+            state["cores"] = self.scheduler.place(session.pid, int(job.get("cores", 1)))
+        elif job.get("affinity"):
+            # explicit affinity is applied below; the scheduler only has to steer around it
+            self.scheduler.pin(session.pid, list(job["affinity"]), apply=False)
+        if job.get("priority") or (job.get("affinity") and job["affinity"] != "auto"):
+            self._apply_controls(state)
+        if job.get("timeout"):
+            state["timer"] = threading.Timer(float(job["timeout"]), self._timeout, args=(state,))
+            state["timer"].daemon = True
+            state["timer"].start()
+
+    def _apply_controls(self, state):
+        job, session = state["job"], state["session"]
+        try:
+            root = psutil.Process(session.pid)
+            procs = [root] + root.children(recursive=True)
+        except psutil.Error:
+            return
+        for proc in procs:
+            control = ProcessControl()
+            control.set_process(proc)
+            try:
+                if job.get("priority"):
+                    control.set_priority(job["priority"])
+                if job.get("affinity") and job["affinity"] != "auto":
+                    control.set_affinity(list(job["affinity"]))
+            except Exception as e:
+                state["warnings"].append(f"pid {proc.pid}: {e}")
+
+    def _timeout(self, state):
+        session = state["session"]
+        if session.is_done():
+            return
+        state["timed_out"] = True
+        try:
+            root = psutil.Process(session.pid)
+            for proc in root.children(recursive=True) + [root]:
+                proc.kill()
+        except psutil.Error:
+            pass
+
+    def _on_sample(self, sample):
+        with self._lock:
+            for pid, reading in sample.processes.items():
+                state = self._by_pid.get(pid)
+                if state is not None:
+                    state["session"].record_sample(reading)
+
+    def _finish(self, state):
+        job, session = state["job"], state["session"]
+        if state["timer"]:
+            state["timer"].cancel()
+        self.monitor.untrack(session.pid)
+        self.rules.unwatch(session.pid)
+        self.scheduler.release(session.pid)
+        status = "timeout" if state["timed_out"] else session.status
+        summary = session.summary or {}
+        result = {
+            "id": job["id"],
+            "command": job["command"],
+            "status": status,
+            "exit_code": session.returncode,
+            "pid": session.pid,
+            "wall_time": round((session.finished or time.time()) - (session.started or time.time()), 6),
+            # exact from wait4 where the kernel reported it, sampled otherwise
+            "cpu_time": summary.get("cpu_time", 0.0),
+            "peak_rss": summary.get("max_rss"),    # None: too short to sample and below the launcher
+            "log_path": session.log_path,
+            "started": session.started,
+            "finished": session.finished,
+            "summary": summary,
+        }
+        for key in ("priority", "affinity", "timeout", "limits", "rules"):
+            if job.get(key) is not None:
+                result[key] = job[key]
+        if state.get("cores"):
+            result["cores"] = state["cores"]
+        if session.error:
+            result["error"] = str(session.error)
+        if session.events:
+            result["events"] = session.events
+        if session.log_stats and (session.log_stats["over_budget"] or session.log_stats["segments"]):
+            result["log"] = session.log_stats
+        if state["warnings"]:
+            result["warnings"] = state["warnings"]
+        with self._lock:
+            self._by_pid.pop(session.pid, None)
+            self.results.append(result)
+            self.out.write(json.dumps(result) + "\n")
+            self.out.flush()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="main.py batch",
+                                     description="Run a manifest of commands in the sandbox without a GUI.")
+    parser.add_argument("manifest", help="JSON/NDJSON job manifest ('-' for stdin)")
+    parser.add_argument("-j", "--concurrency", type=int, default=None,
+                        help="jobs run at once (default: manifest value or 4)")
+    parser.add_argument("-o", "--output", default="-", help="NDJSON results file (default: stdout)")
+    parser.add_argument("--interval", type=float, default=0.5, help="resource sampling interval in seconds")
+    parser.add_argument("--reports", default="reports", help="directory for session logs")
+    parser.add_argument("--auto-affinity", action="store_true",
+                        help="place jobs without an explicit affinity on the least loaded cores")
+    parser.add_argument("--log-max-bytes", type=int, help="per-job log budget in bytes")
+    parser.add_argument("--log-policy", choices=("drop_middle", "sample", "backpressure"),
+                        help="what to do with output over the log budget (default: drop_middle)")
+    parser.add_argument("--keep-sessions", type=int, help="prune reports/ to this many sessions")
+    parser.add_argument("--rules", help="JSON file of rules applied to every job (see sandbox.rule_engine)")
+    parser.add_argument("--metrics-port", type=int,
+                        help="serve OpenMetrics on http://127.0.0.1:PORT/metrics while the batch runs")
+    args = parser.parse_args(argv)
+    if args.metrics_port is not None:
+        from utils.instrumentation import metrics
+        metrics.serve(args.metrics_port)
+
+    settings, jobs = load_manifest(args.manifest)
+    concurrency = args.concurrency or int(settings.get("concurrency", 4))
+    budget = dict(settings.get("log_budget") or {})
+    if args.log_max_bytes:
+        budget["max_bytes"] = args.log_max_bytes
+    if args.log_policy:
+        budget["policy"] = args.log_policy
+    retention = dict(settings.get("retention") or {})
+    if args.keep_sessions:
+        retention["max_sessions"] = args.keep_sessions
+    rules = load_rules(args.rules) if args.rules else [Rule.from_dict(r) for r in settings.get("rules", [])]
+    out = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    try:
+        runner = BatchRunner(jobs, concurrency=concurrency, out=out, poll_interval=args.interval,
+                             reports_dir=args.reports, rules=rules,
+                             auto_affinity=args.auto_affinity or settings.get("affinity") == "auto",
+                             log_budget=LogBudget.from_dict(budget) if budget else None,
+                             retention=LogRetention.from_dict(retention) if retention else None)
+        results = runner.run()
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    failed = [r for r in results if r["exit_code"] != 0 or r["status"] != "finished"]
+    print(f"[batch] {len(results)} jobs, {len(failed)} failed", file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,210 @@
+# sandbox/limits.py
+import os
+import re
+import signal
+import time
+
+try:
+    import resource
+except ImportError:       # Windows: no rlimits
+    resource = None
+
+CGROUP_MOUNT = "/sys/fs/cgroup"
+
+# stderr lines that usually mean the child ran into one of its rlimits
+_LIMIT_PATTERNS = [
+    (re.compile(r"Too many open files|EMFILE"), "open_files_limit"),
+    (re.compile(r"Resource temporarily unavailable|fork: retry|EAGAIN"), "process_limit"),
+    (re.compile(r"MemoryError|Cannot allocate memory|std::bad_alloc|out of memory", re.I), "memory_limit"),
+]
+
+
+class ResourceLimits:
+    """
+    Per-session limits applied when the child launches.
+
+    rlimits (POSIX): cpu_seconds (RLIMIT_CPU), address_space bytes (RLIMIT_AS),
+    open_files (RLIMIT_NOFILE) and processes (RLIMIT_NPROC; note the kernel
+    counts this per user, not per session).
+    cgroup v2 (Linux, when a writable delegated hierarchy exists): cpu_quota in
+    cores (cpu.max) and memory_max bytes (memory.max). Without cgroup support
+    those two are skipped and a "cgroup_unavailable" event is recorded.
+    """
+    def __init__(self, cpu_seconds=None, address_space=None, open_files=None, processes=None,
+                 cpu_quota=None, memory_max=None, cgroup_root=None):
+        self.cpu_seconds = cpu_seconds
+        self.address_space = address_space
+        self.open_files = open_files
+        self.processes = processes
+        self.cpu_quota = cpu_quota
+        self.memory_max = memory_max
+        self.cgroup_root = cgroup_root
+
+    @classmethod
+    def from_dict(cls, d):
+        return cls(**{k: v for k, v in (d or {}).items() if v is not None})
+
+    def as_dict(self):
+        return {k: v for k, v in vars(self).items() if v is not None}
+
+    def _rlimits(self):
+        if resource is None:
+            return []
+        pairs = [(resource.RLIMIT_CPU, self.cpu_seconds), (resource.RLIMIT_AS, self.address_space),
+                 (resource.RLIMIT_NOFILE, self.open_files)]
+        if hasattr(resource, "RLIMIT_NPROC"):
+            pairs.append((resource.RLIMIT_NPROC, self.processes))
+        out = []
+        for which, value in pairs:
+            if value is not None:
+                value = int(value)
+                # CPU: soft limit sends SIGXCPU, hard limit one second later kills
+                hard = value + 1 if which == resource.RLIMIT_CPU else value
+                out.append((which, value, hard))
+        return out
+
+    def wants_cgroup(self):
+        return self.cpu_quota is not None or self.memory_max is not None
+
+    def preexec_fn(self, cgroup=None):
+        """Function for Popen(preexec_fn=...): joins the cgroup and sets rlimits in the child."""
+        rlimits = self._rlimits()
+        procs_file = os.path.join(cgroup.path, "cgroup.procs") if cgroup else None
+
+        def apply():
+            if procs_file:
+                with open(procs_file, "w") as f:
+                    f.write(str(os.getpid()))
+            for which, soft, hard in rlimits:
+                resource.setrlimit(which, (soft, hard))
+        return apply if (rlimits or procs_file) else None
+
+    def apply_to_pid(self, pid, cgroup=None):
+        """For launchers without preexec (posix_spawn, zygote): limit an already running pid."""
+        if cgroup:
+            cgroup.add(pid)
+        for which, soft, hard in self._rlimits():
+            resource.prlimit(pid, which, (soft, hard))
+
+    def apply_in_child(self):
+        """Set rlimits on the calling process (e.g. a freshly forked child)."""
+        for which, soft, hard in self._rlimits():
+            resource.setrlimit(which, (soft, hard))
+
+    def exit_events(self, returncode):
+        """Limit events that can be read off the exit status."""
+        if returncode is None or self.cpu_seconds is None:
+            return []
+        # direct child killed by SIGXCPU, or a shell reporting it as 128+signal
+        xcpu = getattr(signal, "SIGXCPU", None)
+        if xcpu is not None and returncode in (-xcpu, 128 + xcpu):
+            return [{"type": "cpu_limit", "limit": self.cpu_seconds, "returncode": returncode}]
+        return []
+
+    @staticmethod
+    def match_output(line):
+        """Event type suggested by a stderr line, or None."""
+        for pattern, kind in _LIMIT_PATTERNS:
+            if pattern.search(line):
+                return kind
+        return None
+
+
+class CgroupV2:
+    """
+    A child cgroup in a delegated cgroup v2 hierarchy. The parent defaults to
+    the cgroup this process runs in (read from /proc/self/cgroup) and must allow
+    the cpu and memory controllers in its subtree.
+    """
+    def __init__(self, path):
+        self.path = path
+
+    @staticmethod
+    def parent_dir(root=None):
+        if root:
+            return root
+        try:
+            with open("/proc/self/cgroup") as f:
+                for line in f:
+                    if line.startswith("0::"):
+                        return os.path.join(CGROUP_MOUNT, line[3:].strip().lstrip("/"))
+        except OSError:
+            pass
+        return None
+
+    @classmethod
+    def available(cls, root=None):
+        parent = cls.parent_dir(root)
+        if not parent or not os.path.exists(os.path.join(parent, "cgroup.controllers")):
+            return False
+        with open(os.path.join(parent, "cgroup.controllers")) as f:
+            controllers = f.read().split()
+        return "cpu" in controllers and "memory" in controllers and os.access(parent, os.W_OK)
+
+    @classmethod
+    def create(cls, name, limits, root=None):
+        """Create and configure a cgroup for one session; returns None if not possible."""
+        if not cls.available(root):
+            return None
+        parent = cls.parent_dir(root)
+        try:
+            with open(os.path.join(parent, "cgroup.subtree_control"), "w") as f:
+                f.write("+cpu +memory")
+        except OSError:
+            pass    # already enabled, or the parent still holds processes
+        path = os.path.join(parent, name)
+        try:
+            os.makedirs(path, exist_ok=True)
+            cg = cls(path)
+            if limits.cpu_quota is not None:
+                period = 100000
+                cg._write("cpu.max", f"{int(float(limits.cpu_quota) * period)} {period}")
+            if limits.memory_max is not None:
+                cg._write("memory.max", str(int(limits.memory_max)))
+            return cg
+        except OSError:
+            try:
+                os.rmdir(path)
+            except OSError:
+                pass
+            return None
+
+    def _write(self, name, value):
+        with open(os.path.join(self.path, name), "w") as f:
+            f.write(value)
+
+    def _read_kv(self, name):
+        try:
+            with open(os.path.join(self.path, name)) as f:
+                return {k: int(v) for k, v in (line.split() for line in f if line.strip())}
+        except (OSError, ValueError):
+            return {}
+
+    def add(self, pid):
+        self._write("cgroup.procs", str(pid))
+
+    def events(self):
+        """Limit events recorded by the kernel for this cgroup."""
+        out = []
+        mem = self._read_kv("memory.events")
+        if mem.get("oom_kill"):
+            out.append({"type": "memory_limit", "oom_kills": mem["oom_kill"]})
+        elif mem.get("max"):
+            out.append({"type": "memory_pressure", "hits": mem["max"]})
+        cpu = self._read_kv("cpu.stat")
+        if cpu.get("nr_throttled"):
+            out.append({"type": "cpu_throttled", "periods": cpu["nr_throttled"],
+                        "throttled_usec": cpu.get("throttled_usec", 0)})
+        return out
+
+    def remove(self, timeout=2.0):
+        # the cgroup can only go once its last process has been reaped
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                os.rmdir(self.path)
+                return True
+            except OSError:
+                if time.monotonic() > deadline:
+                    return False
+                time.sleep(0.05)
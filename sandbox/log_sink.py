@@ -0,0 +1,360 @@
+# sandbox/log_sink.py
+"""
+Session log files with a size budget.
+
+LogSink is the file StreamPump writes a session's output to. It rotates the
+live file into numbered segments (gzip'd in the background) and, once the
+session's byte or line budget is used up, applies the budget's policy:
+
+  "drop_middle"  - keep the head on disk and the most recent lines in memory;
+                   on close a marker with the omitted counts and the tail follow
+  "sample"       - keep 1 line in `sample_every`, halving the rate each time
+                   another budget's worth (bytes or lines) has been written
+  "backpressure" - write everything, but throttle the reader to
+                   `backpressure_rate` bytes/s so the child blocks on its pipes
+
+LogRetention prunes whole sessions (log, segments, metadata) from reports/ by
+total size, age and count. Compression and pruning run on one shared
+housekeeping thread.
+"""
+import glob
+import gzip
+import io
+import os
+import queue
+import re
+import shutil
+import threading
+import time
+from collections import deque
+
+POLICIES = ("drop_middle", "sample", "backpressure")
+SESSION_FILE_RE = re.compile(r"^(sandbox_log_\d{8}_\d{6}(?:_\d+)?)\.(txt|json|part\d+\.log(?:\.gz)?)$")
+PART_RE = re.compile(r"\.part(\d+)\.log(\.gz)?$")
+
+
+class LogBudget:
+    """
+    Per-session log limits. max_bytes/max_lines cap what reaches the disk
+    (None: unlimited); segment_bytes rotates the live file at that size (a
+    segment only exceeds it when a single line is longer).
+    """
+    def __init__(self, max_bytes=None, max_lines=None, policy="drop_middle", segment_bytes=None,
+                 compress=True, sample_every=10, backpressure_rate=256 * 1024, tail_bytes=4 * 1024 * 1024):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown log policy: {policy}")
+        self.max_bytes = max_bytes
+        self.max_lines = max_lines
+        self.policy = policy
+        self.segment_bytes = segment_bytes
+        self.compress = compress
+        self.sample_every = sample_every
+        self.backpressure_rate = backpressure_rate
+        self.tail_bytes = tail_bytes        # drop_middle keeps at most this much tail in memory
+
+    @classmethod
+    def from_dict(cls, d):
+        return cls(**{k: v for k, v in (d or {}).items() if v is not None})
+
+    def as_dict(self):
+        return {k: v for k, v in vars(self).items() if v is not None}
+
+    def limited(self):
+        return self.max_bytes is not None or self.max_lines is not None
+
+
+class LogSink:
+    """
+    Budgeted, rotating writer for one session's log; StreamPump hands it lines
+    through write_lines(). The live segment is always `path`, rotated segments
+    are <stem>.partNNN.log(.gz) in write order.
+    """
+    def __init__(self, path, budget=None):
+        self.path = path
+        self.budget = budget or LogBudget()
+        self.segments = []
+        self.bytes_in = self.lines_in = 0
+        self.bytes_written = self.lines_written = 0
+        self.dropped_bytes = self.dropped_lines = 0
+        self._segment_size = 0
+        self._over = None               # time the budget ran out
+        self._over_written = 0
+        self._tail = deque()
+        self._tail_size = 0
+        b = self.budget
+        # drop_middle splits the budget between the head on disk and the tail
+        share = 2 if b.policy == "drop_middle" else 1
+        self._head_bytes = b.max_bytes // share if b.max_bytes is not None else None
+        self._head_lines = b.max_lines // share if b.max_lines is not None else None
+        self._tail_bytes = min(b.max_bytes - self._head_bytes, b.tail_bytes) if b.max_bytes is not None \
+            else b.tail_bytes
+        self._tail_lines = b.max_lines - self._head_lines if b.max_lines is not None else None
+        self._sample_every = b.sample_every
+        self._sample_seen = 0
+        self._sample_mark = None        # (bytes, lines) written when the rate last changed
+        self._f = open(path, "wb", buffering=1024 * 1024)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # ---------- writing ----------
+    def write_lines(self, lines):
+        data = ("\n".join(lines) + "\n").encode("utf-8", "replace")
+        self.bytes_in += len(data)
+        self.lines_in += len(lines)
+        seg = self.budget.segment_bytes
+        if self._over is None and self._fits(len(data), len(lines)) and \
+                (not seg or self._segment_size + len(data) <= seg):
+            self._write(data, len(lines))
+            return
+        # line by line: budget and segment boundaries fall between lines
+        for line in lines:
+            self._line((line + "\n").encode("utf-8", "replace"))
+
+    def write(self, text):
+        """File-like write; text is split into lines."""
+        if text:
+            self.write_lines(text[:-1].split("\n") if text.endswith("\n") else text.split("\n"))
+
+    def _fits(self, size, lines):
+        return (self._head_bytes is None or self.bytes_written + size <= self._head_bytes) and \
+               (self._head_lines is None or self.lines_written + lines <= self._head_lines)
+
+    def _line(self, data):
+        if self._over is None:
+            if self._fits(len(data), 1):
+                self._write(data, 1)
+                return
+            self._over = time.monotonic()
+            self._sample_mark = (self.bytes_written, self.lines_written)
+            if self.budget.policy == "sample":
+                self._marker(f"[... log budget reached: keeping 1 in {self._sample_every} lines ...]")
+        policy = self.budget.policy
+        if policy == "backpressure":
+            self._write(data, 1)
+            self._over_written += len(data)
+        elif policy == "sample":
+            self._sample_seen += 1
+            if self._sample_seen % self._sample_every:
+                self._drop(len(data))
+                return
+            self._write(data, 1)
+            b = self.budget
+            if (b.max_bytes and self.bytes_written - self._sample_mark[0] >= b.max_bytes) or \
+                    (b.max_lines and self.lines_written - self._sample_mark[1] >= b.max_lines):
+                self._sample_mark = (self.bytes_written, self.lines_written)
+                self._sample_every *= 2
+                self._marker(f"[... log budget reached again: keeping 1 in {self._sample_every} lines ...]")
+        else:
+            self._tail.append(data)
+            self._tail_size += len(data)
+            while self._tail and (self._tail_size > self._tail_bytes or
+                                  (self._tail_lines is not None and len(self._tail) > self._tail_lines)):
+                old = self._tail.popleft()
+                self._tail_size -= len(old)
+                self._drop(len(old))
+
+    def _drop(self, size):
+        self.dropped_lines += 1
+        self.dropped_bytes += size
+
+    def _marker(self, text):
+        self._write((text + "\n").encode("utf-8"), 1)
+
+    def _write(self, data, lines):
+        seg = self.budget.segment_bytes
+        if seg and self._segment_size and self._segment_size + len(data) > seg:
+            self._rotate()
+        self._f.write(data)
+        self._segment_size += len(data)
+        self.bytes_written += len(data)
+        self.lines_written += lines
+
+    def _rotate(self):
+        self._f.close()
+        stem = os.path.splitext(self.path)[0]
+        part = f"{stem}.part{len(self.segments) + 1:03d}.log"
+        os.replace(self.path, part)
+        self._f = open(self.path, "wb", buffering=1024 * 1024)
+        self._segment_size = 0
+        if self.budget.compress:
+            self.segments.append(part + ".gz")
+            housekeeper().submit(gzip_file, part)
+        else:
+            self.segments.append(part)
+
+    def throttle(self):
+        """Seconds the reader should pause; non-zero only for backpressure once over budget."""
+        if self._over is None or self.budget.policy != "backpressure":
+            return 0.0
+        due = self._over_written / float(self.budget.backpressure_rate)
+        return max(0.0, due - (time.monotonic() - self._over))
+
+    def flush(self):
+        self._f.flush()
+
+    def close(self):
+        if self._f.closed:
+            return
+        if self._tail:
+            self._marker(f"[... {self.dropped_lines} lines ({self.dropped_bytes} bytes) omitted "
+                         f"by the log budget ...]")
+            for data in self._tail:
+                self._write(data, 1)
+            self._tail.clear()
+        self._f.close()
+
+    def stats(self):
+        return {
+            "bytes_in": self.bytes_in,
+            "lines_in": self.lines_in,
+            "bytes_written": self.bytes_written,
+            "lines_written": self.lines_written,
+            "dropped_lines": self.dropped_lines,
+            "dropped_bytes": self.dropped_bytes,
+            "over_budget": self._over is not None,
+            "policy": self.budget.policy if self.budget.limited() else None,
+            "segments": list(self.segments),
+        }
+
+
+def session_log_files(log_path):
+    """A session's log in write order: rotated segments (oldest first), then the live file."""
+    stem = os.path.splitext(log_path)[0]
+    parts = {}
+    for path in glob.glob(glob.escape(stem) + ".part*.log*"):
+        m = PART_RE.search(path)
+        if m and path[:m.start()] == stem:
+            # while a segment is being compressed both exist; the plain one is complete
+            n = int(m.group(1))
+            if n not in parts or not m.group(2):
+                parts[n] = path
+    files = [parts[n] for n in sorted(parts)]
+    if os.path.exists(log_path):
+        files.append(log_path)
+    return files
+
+
+def open_log_file(path, buffering=-1):
+    """
+    Open one log file (plain or .gz) for reading text; returns (text stream,
+    raw file), the raw file's tell() being the on-disk bytes consumed so far.
+    """
+    raw = open(path, "rb", buffering=buffering)
+    try:
+        stream = gzip.GzipFile(fileobj=raw, mode="rb") if path.endswith(".gz") else raw
+        return io.TextIOWrapper(stream, encoding="utf-8", errors="replace"), raw
+    except Exception:
+        raw.close()
+        raise
+
+
+def gzip_file(path):
+    """Compress path to path.gz (written under a temporary name first) and remove path."""
+    tmp = path + ".gz.tmp"
+    with open(path, "rb") as src, gzip.open(tmp, "wb", compresslevel=6) as dst:
+        shutil.copyfileobj(src, dst, 1024 * 1024)
+    os.replace(tmp, path + ".gz")
+    os.remove(path)
+
+
+class LogRetention:
+    """
+    Keeps reports/ within limits by deleting whole sessions, oldest first:
+    max_total_bytes over all session files, max_age_days, max_sessions.
+    """
+    def __init__(self, max_total_bytes=None, max_age_days=None, max_sessions=None):
+        self.max_total_bytes = max_total_bytes
+        self.max_age_days = max_age_days
+        self.max_sessions = max_sessions
+
+    @classmethod
+    def from_dict(cls, d):
+        return cls(**{k: v for k, v in (d or {}).items() if v is not None})
+
+    def enforce(self, reports_dir, keep=()):
+        """Delete sessions beyond the limits, except stems in `keep` (live sessions); returns removed stems."""
+        groups = {}
+        try:
+            names = os.listdir(reports_dir)
+        except OSError:
+            return []
+        for name in names:
+            m = SESSION_FILE_RE.match(name)
+            if not m:
+                continue
+            path = os.path.join(reports_dir, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            g = groups.setdefault(m.group(1), {"paths": [], "size": 0, "mtime": 0.0})
+            g["paths"].append(path)
+            g["size"] += st.st_size
+            g["mtime"] = max(g["mtime"], st.st_mtime)
+        keep = {os.path.splitext(os.path.basename(k))[0] for k in keep}
+        ordered = sorted(((stem, g) for stem, g in groups.items() if stem not in keep),
+                         key=lambda item: item[1]["mtime"])
+        total = sum(g["size"] for g in groups.values())
+        count = len(groups)
+        cutoff = time.time() - self.max_age_days * 86400 if self.max_age_days is not None else None
+        removed = []
+        for stem, g in ordered:
+            over = (self.max_total_bytes is not None and total > self.max_total_bytes) or \
+                   (self.max_sessions is not None and count > self.max_sessions) or \
+                   (cutoff is not None and g["mtime"] < cutoff)
+            if not over:
+                continue
+            for path in g["paths"]:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            total -= g["size"]
+            count -= 1
+            removed.append(stem)
+        return removed
+
+
+class _Housekeeper:
+    """One daemon thread running background log chores (compression, pruning) in order."""
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, fn, *args, **kwargs):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, daemon=True, name="log-housekeeper")
+                self._thread.start()
+        self._queue.put((fn, args, kwargs))
+
+    def join(self):
+        """Wait until every chore submitted so far has run."""
+        self._queue.join()
+
+    def _loop(self):
+        while True:
+            fn, args, kwargs = self._queue.get()
+            try:
+                fn(*args, **kwargs)
+            except Exception:
+                pass
+            finally:
+                self._queue.task_done()
+
+
+_housekeeper = None
+_housekeeper_lock = threading.Lock()
+
+
+def housekeeper():
+    global _housekeeper
+    with _housekeeper_lock:
+        if _housekeeper is None:
+            _housekeeper = _Housekeeper()
+        return _housekeeper
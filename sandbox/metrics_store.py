@@ -0,0 +1,185 @@
+# sandbox/metrics_store.py
+import threading
+import time
+from array import array
+
+SYSTEM = "system"
+
+# (bucket seconds, buckets kept): 1 s for an hour, 10 s for 6 hours, 1 min for a day
+DEFAULT_TIERS = ((1, 3600), (10, 2160), (60, 1440))
+
+
+class _Ring:
+    """Fixed-capacity ring of doubles; grows lazily up to capacity, then overwrites."""
+    __slots__ = ("capacity", "data", "start")
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.data = array("d")
+        self.start = 0
+
+    def append(self, value):
+        if len(self.data) < self.capacity:
+            self.data.append(value)
+        else:
+            self.data[self.start] = value
+            self.start = (self.start + 1) % self.capacity
+
+    def __len__(self):
+        return len(self.data)
+
+    def first(self):
+        return self.data[self.start] if self.data else None
+
+    def tolist(self):
+        return (self.data[self.start:] + self.data[:self.start]).tolist()
+
+
+class _Tier:
+    """min/max/mean per fixed-width time bucket, for one resolution."""
+    __slots__ = ("resolution", "ts", "min", "max", "mean", "_bucket", "_lo", "_hi", "_sum", "_n")
+
+    def __init__(self, resolution, capacity):
+        self.resolution = resolution
+        self.ts, self.min, self.max, self.mean = (_Ring(capacity) for _ in range(4))
+        self._bucket = None
+        self._n = 0
+
+    def add(self, ts, value):
+        bucket = int(ts // self.resolution)
+        if bucket != self._bucket:
+            self._close()
+            self._bucket, self._lo, self._hi, self._sum, self._n = bucket, value, value, 0.0, 0
+        self._lo = min(self._lo, value)
+        self._hi = max(self._hi, value)
+        self._sum += value
+        self._n += 1
+
+    def _close(self):
+        if self._n:
+            self.ts.append(self._bucket * self.resolution)
+            self.min.append(self._lo)
+            self.max.append(self._hi)
+            self.mean.append(self._sum / self._n)
+
+    def rows(self):
+        """Closed buckets plus the one still filling, as (ts, min, max, mean) lists."""
+        ts, lo, hi, mean = self.ts.tolist(), self.min.tolist(), self.max.tolist(), self.mean.tolist()
+        if self._n:
+            ts.append(self._bucket * self.resolution)
+            lo.append(self._lo)
+            hi.append(self._hi)
+            mean.append(self._sum / self._n)
+        return ts, lo, hi, mean
+
+    def oldest(self):
+        return self.ts.first() if len(self.ts) else (self._bucket * self.resolution if self._n else None)
+
+
+class _Series:
+    def __init__(self, raw_capacity, tiers):
+        self.ts = _Ring(raw_capacity)
+        self.values = _Ring(raw_capacity)
+        self.tiers = [_Tier(res, cap) for res, cap in tiers]
+
+    def add(self, ts, value):
+        self.ts.append(ts)
+        self.values.append(value)
+        for tier in self.tiers:
+            tier.add(ts, value)
+
+
+class MetricsStore:
+    """
+    Bounded in-memory history for monitor samples. Every (key, metric) pair
+    keeps the last raw_capacity samples plus min/max/mean roll-ups at coarser
+    resolutions, so long sessions can still be charted in fixed memory.
+    Keys are SYSTEM for host-wide numbers or a pid for tracked processes;
+    once more than max_keys pids are stored the least recently updated is evicted.
+    """
+    def __init__(self, raw_capacity=300, tiers=DEFAULT_TIERS, max_keys=256):
+        self.raw_capacity = raw_capacity
+        self.tier_spec = tuple(tiers)
+        self.max_keys = max_keys
+        self._series = {}          # key -> {metric: _Series}
+        self._updated = {}         # key -> last record time
+        self._lock = threading.Lock()
+
+    def record(self, key, metrics, ts=None):
+        """Append one sample: metrics is {name: number}."""
+        ts = time.time() if ts is None else ts
+        with self._lock:
+            per_key = self._series.get(key)
+            if per_key is None:
+                per_key = self._series[key] = {}
+                self._updated[key] = ts
+                self._evict()
+            for name, value in metrics.items():
+                series = per_key.get(name)
+                if series is None:
+                    series = per_key[name] = _Series(self.raw_capacity, self.tier_spec)
+                series.add(ts, float(value))
+            self._updated[key] = ts
+
+    def _evict(self):
+        pids = [k for k in self._series if k != SYSTEM]
+        while len(pids) > self.max_keys:
+            oldest = min(pids, key=lambda k: self._updated.get(k, 0))
+            pids.remove(oldest)
+            self._series.pop(oldest, None)
+            self._updated.pop(oldest, None)
+
+    def keys(self):
+        with self._lock:
+            return list(self._series)
+
+    def metrics(self, key):
+        with self._lock:
+            return list(self._series.get(key, {}))
+
+    def drop(self, key):
+        with self._lock:
+            self._series.pop(key, None)
+            self._updated.pop(key, None)
+
+    def raw(self, key, metric):
+        """Full-rate samples still held for (key, metric) as (timestamps, values)."""
+        with self._lock:
+            series = self._series.get(key, {}).get(metric)
+            if series is None:
+                return [], []
+            return series.ts.tolist(), series.values.tolist()
+
+    def rollup(self, key, metric, resolution):
+        """Roll-up rows at one resolution as (timestamps, mins, maxs, means)."""
+        with self._lock:
+            series = self._series.get(key, {}).get(metric)
+            for tier in (series.tiers if series else ()):
+                if tier.resolution == resolution:
+                    return tier.rows()
+        return [], [], [], []
+
+    def history(self, key, metric, since=None):
+        """
+        (timestamps, values) covering everything since `since` (or all history)
+        at the finest resolution that still reaches back that far.
+        """
+        with self._lock:
+            series = self._series.get(key, {}).get(metric)
+            if series is None:
+                return [], []
+            # a ring that never wrapped still holds everything recorded
+            if len(series.ts) < series.ts.capacity or (since is not None and series.ts.first() <= since):
+                ts, values = series.ts.tolist(), series.values.tolist()
+                if since is not None:
+                    start = next((i for i, t in enumerate(ts) if t >= since), len(ts))
+                    ts, values = ts[start:], values[start:]
+                return ts, values
+            for tier in series.tiers:
+                if len(tier.ts) < tier.ts.capacity or (since is not None and tier.oldest() <= since):
+                    break
+            ts, _, _, mean = tier.rows()
+        if since is not None:
+            start = next((i for i, t in enumerate(ts) if t >= since - tier.resolution), len(ts))
+            ts, mean = ts[start:], mean[start:]
+        return ts, mean
@@ -2,7 +2,7 @@
 import psutil
 import os
 
-# Windows-friendly priority map (psutil constants)
+# Windows-friendly priority map (psutil constants; they only exist on Windows)
 WINDOWS_PRIORITIES = {
     "Idle": psutil.IDLE_PRIORITY_CLASS,
     "Below Normal": psutil.BELOW_NORMAL_PRIORITY_CLASS,
@@ -10,7 +10,9 @@ WINDOWS_PRIORITIES = {
     "Above Normal": psutil.ABOVE_NORMAL_PRIORITY_CLASS,
     "High": psutil.HIGH_PRIORITY_CLASS,
     "Realtime": psutil.REALTIME_PRIORITY_CLASS,
-}
+} if os.name == "nt" else {}
+# on POSIX, the same names map to nice values
+POSIX_NICE = {"Idle": 19, "Below Normal": 10, "Normal": 0, "Above Normal": -5, "High": -10, "Realtime": -20}
 
 class ProcessControl:
     def __init__(self):
@@ -31,12 +33,7 @@ class ProcessControl:
                 raise ValueError("Unknown priority")
             self.psproc.nice(val)
         else:
-            # on POSIX, map to nice values
-            mapping = {
-                "Idle": 19, "Below Normal": 10, "Normal": 0,
-                "Above Normal": -5, "High": -10, "Realtime": -20
-            }
-            self.psproc.nice(mapping.get(level_name, 0))
+            self.psproc.nice(POSIX_NICE.get(level_name, 0))
 
     def set_affinity(self, cores):
         if not self.psproc:
@@ -46,3 +43,59 @@ class ProcessControl:
         except AttributeError:
             # not supported on some systems
             raise RuntimeError("Setting affinity is not supported on this OS")
+
+    def renice(self, value):
+        """
+        Set a raw nice value (POSIX) or priority class (Windows) on the process
+        and its descendants; a priority name as used by set_priority() works too.
+        """
+        if isinstance(value, str):
+            if os.name == "nt":
+                if value not in WINDOWS_PRIORITIES:
+                    raise ValueError("Unknown priority")
+                value = WINDOWS_PRIORITIES[value]
+            else:
+                value = POSIX_NICE.get(value, 0)
+        self._each("nice", value)
+
+    def shrink_affinity(self, keep=None):
+        """Restrict the process and its descendants to the first `keep` of its current cores (default: half)."""
+        if not self.psproc:
+            raise RuntimeError("No process attached")
+        try:
+            cores = self.psproc.cpu_affinity()
+        except AttributeError:
+            raise RuntimeError("Setting affinity is not supported on this OS")
+        keep = max(1, int(keep) if keep else len(cores) // 2)
+        if keep < len(cores):
+            self._each("cpu_affinity", cores[:keep])
+        return cores[:keep]
+
+    # the process and its descendants, children first (shell-launched workloads live below /bin/sh)
+    def _tree(self):
+        if not self.psproc:
+            raise RuntimeError("No process attached")
+        try:
+            return self.psproc.children(recursive=True)[::-1] + [self.psproc]
+        except psutil.NoSuchProcess:
+            return []
+
+    def _each(self, method, *args):
+        # for a shell-launched session the workload is a descendant of the root
+        for proc in self._tree():
+            try:
+                getattr(proc, method)(*args)
+            except psutil.NoSuchProcess:
+                pass
+
+    def suspend(self):
+        self._each("suspend")
+
+    def resume(self):
+        self._each("resume")
+
+    def terminate(self):
+        self._each("terminate")
+
+    def kill(self):
+        self._each("kill")
@@ -0,0 +1,116 @@
+# sandbox/process_tree.py
+import os
+import psutil
+
+
+def read_process(proc):
+    """One reading for a process; raises psutil.Error if it is gone."""
+    with proc.oneshot():
+        mem = proc.memory_info()
+        times = proc.cpu_times()
+        try:
+            fds = proc.num_handles() if os.name == "nt" else proc.num_fds()
+        except psutil.AccessDenied:
+            fds = 0   # other users' processes: fd table is not readable
+        try:
+            io = proc.io_counters()
+            read_bytes, write_bytes = io.read_bytes, io.write_bytes
+        except (psutil.AccessDenied, AttributeError):
+            read_bytes = write_bytes = 0   # not readable, or not available on this platform (macOS)
+        return {
+            "pid": proc.pid,
+            "name": proc.name(),
+            "cpu": proc.cpu_percent(interval=None),
+            # own CPU seconds plus those of children it has already reaped
+            "cpu_time": times.user + times.system + getattr(times, "children_user", 0.0)
+                        + getattr(times, "children_system", 0.0),
+            "mem": proc.memory_percent(),
+            "rss": mem.rss,
+            "threads": proc.num_threads(),
+            "fds": fds,
+            "read_bytes": read_bytes,
+            "write_bytes": write_bytes,
+        }
+
+
+class ProcessTree:
+    """
+    A root process plus (optionally) all of its descendants. psutil.Process
+    objects are cached across samples so cpu_percent deltas stay meaningful;
+    new children are picked up and exited ones dropped on every refresh.
+
+    For shell-launched commands the root is usually just /bin/sh, so the real
+    workload only shows up in the aggregate.
+    """
+    def __init__(self, root, include_children=True):
+        if not isinstance(root, psutil.Process):
+            root = psutil.Process(root)
+        self.root = root
+        self.include_children = include_children
+        self._procs = {}
+        self._add(root)
+
+    @property
+    def pid(self):
+        return self.root.pid
+
+    def _add(self, proc):
+        self._procs[proc.pid] = proc
+        try:
+            proc.cpu_percent(interval=None)   # prime the CPU delta
+        except psutil.Error:
+            pass
+
+    def refresh(self):
+        """Sync the cached process set with the live tree; returns False once the root is gone."""
+        if not self.root.is_running():
+            self._procs.clear()
+            return False
+        if not self.include_children:
+            return True
+        try:
+            live = self.root.children(recursive=True)
+        except psutil.Error:
+            return self.root.is_running()
+        seen = {self.root.pid}
+        for child in live:
+            seen.add(child.pid)
+            cached = self._procs.get(child.pid)
+            # same pid but different create_time means the pid was reused
+            if cached is None or cached != child:
+                self._add(child)
+        for pid in list(self._procs):
+            if pid not in seen:
+                del self._procs[pid]
+        return True
+
+    def pids(self):
+        return list(self._procs)
+
+    def sample(self):
+        """
+        Aggregate reading for the tree (cpu, cpu_time, mem, rss, threads, fds and
+        read_bytes/write_bytes summed over all live members) with per-process
+        readings under "children".
+        Raises psutil.NoSuchProcess when the root has exited.
+        """
+        if not self.refresh():
+            raise psutil.NoSuchProcess(self.root.pid)
+        total = {"pid": self.root.pid, "cpu": 0.0, "cpu_time": 0.0, "mem": 0.0, "rss": 0, "threads": 0,
+                 "fds": 0, "read_bytes": 0, "write_bytes": 0, "procs": 0, "children": {}}
+        for pid, proc in list(self._procs.items()):
+            try:
+                r = read_process(proc)
+            except psutil.Error:
+                del self._procs[pid]
+                continue
+            for key in ("cpu", "cpu_time", "mem", "rss", "threads", "fds", "read_bytes", "write_bytes"):
+                total[key] += r[key]
+            total["procs"] += 1
+            if pid == self.root.pid:
+                total["name"] = r["name"]
+            else:
+                total["children"][pid] = r
+        if self.root.pid not in self._procs:
+            raise psutil.NoSuchProcess(self.root.pid)
+        return total
@@ -2,25 +2,158 @@
 import psutil
 import threading
 import time
+from collections import namedtuple
+
+from sandbox.process_tree import ProcessTree
+from sandbox.metrics_store import SYSTEM
+from utils.instrumentation import metrics
+
+STORED_METRICS = ("cpu", "mem", "rss", "threads", "fds")
+
+# one monitor pass: wall-clock time, system cpu/mem percent and {pid: reading}
+Sample = namedtuple("Sample", "ts cpu mem processes")
+
+PASS_SECONDS = metrics.histogram("monitor_pass_seconds", "Duration of one monitor sampling pass")
+TRACKED_PROCESSES = metrics.gauge("monitor_tracked_processes", "Process trees read in the latest monitor pass")
+
 
 class ResourceMonitor:
     """
-    Polls system CPU & memory, and if attached to a psutil.Process,
-    polls process CPU% / memory% too via provided callbacks.
+    Polls system CPU & memory, and every tracked psutil.Process, once per
+    poll_interval in a single pass. Process CPU is measured as the delta since
+    the previous pass (no per-process sleeps), and each process is read inside
+    a oneshot() context so /proc is parsed once per sample. Tracked processes
+    may be whole trees (see ProcessTree), which is what attach_process uses so
+    shell-launched workloads are counted.
+
+    system_callback(cpu_percent, mem_percent) gets the system numbers,
+    batch_callback(readings) gets {pid: reading} for all tracked processes, and
+    process_callback(proc_cpu, proc_mem) keeps reporting the attached process.
+    With a MetricsStore every pass is also recorded there (SYSTEM key and per pid).
+
+    This is the single sampling source for the app: each pass is published
+    once as a Sample to every subscribe()d consumer (labels, live chart, alert
+    rules), so all views share the same timestamps.
     """
-    def __init__(self, system_callback, process_callback=None, poll_interval=1.0):
+    def __init__(self, system_callback, process_callback=None, poll_interval=1.0, batch_callback=None,
+                 store=None):
         self.system_callback = system_callback      # called with (cpu_percent, mem_percent)
         self.process_callback = process_callback    # called with (proc_cpu, proc_mem)
+        self.batch_callback = batch_callback        # called with {pid: reading}
         self.poll_interval = poll_interval
+        self.store = store                          # optional MetricsStore for history
         self._running = False
         self._psproc = None
+        self._trees = {}                            # root pid -> ProcessTree
+        self._subscribers = []
+        self.latest = None                          # most recent Sample
+        self._lock = threading.Lock()
+        self.last_pass_duration = 0.0
 
-    def attach_process(self, psproc):
+    # ---------- tracked processes ----------
+    def attach_process(self, psproc, tree=True):
         self._psproc = psproc
+        self.track(psproc, tree=tree)
 
     def detach_process(self):
+        if self._psproc is not None:
+            self.untrack(self._psproc.pid)
         self._psproc = None
 
+    def track(self, proc, tree=False):
+        """
+        Track a pid or psutil.Process; returns the pid. With tree=True the
+        reading aggregates the process and all of its descendants.
+        """
+        with self._lock:
+            pid = proc.pid if isinstance(proc, psutil.Process) else proc
+            if pid in self._trees:
+                return pid
+        entry = ProcessTree(proc, include_children=tree)
+        with self._lock:
+            self._trees.setdefault(entry.pid, entry)
+        return entry.pid
+
+    def untrack(self, pid):
+        with self._lock:
+            self._trees.pop(pid, None)
+
+    def tracked(self):
+        with self._lock:
+            return list(self._trees)
+
+    # ---------- sampling ----------
+    def sample_processes(self):
+        """Read every tracked process (or tree) once; exited ones are dropped from tracking."""
+        with self._lock:
+            trees = list(self._trees.values())
+        readings, gone = {}, []
+        for entry in trees:
+            try:
+                readings[entry.pid] = entry.sample()
+            except psutil.Error:
+                gone.append(entry.pid)
+        if gone:
+            with self._lock:
+                for pid in gone:
+                    self._trees.pop(pid, None)
+        return readings
+
+    def sample(self):
+        """Take one timestamped Sample of the system and every tracked process."""
+        t0 = time.monotonic()
+        ts = time.time()
+        cpu = psutil.cpu_percent(interval=None)
+        mem = psutil.virtual_memory().percent
+        readings = self.sample_processes()
+        self.last_pass_duration = time.monotonic() - t0
+        PASS_SECONDS.observe(self.last_pass_duration)
+        TRACKED_PROCESSES.set(len(readings))
+        return Sample(ts, cpu, mem, readings)
+
+    # ---------- subscribers ----------
+    def subscribe(self, callback):
+        """callback(sample) is called on the monitor thread after every pass."""
+        with self._lock:
+            if callback not in self._subscribers:
+                self._subscribers.append(callback)
+        return callback
+
+    def unsubscribe(self, callback):
+        with self._lock:
+            if callback in self._subscribers:
+                self._subscribers.remove(callback)
+
+    def publish(self, sample):
+        self.latest = sample
+        if self.store is not None:
+            self._record(sample)
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for callback in [self._legacy_callbacks] + subscribers:
+            try:
+                callback(sample)
+            except Exception:
+                # one broken view must not stop sampling for the others
+                pass
+
+    def _record(self, sample):
+        self.store.record(SYSTEM, {"cpu": sample.cpu, "mem": sample.mem}, sample.ts)
+        for pid, r in sample.processes.items():
+            self.store.record(pid, {k: r[k] for k in STORED_METRICS if k in r}, sample.ts)
+
+    def _legacy_callbacks(self, sample):
+        if self.system_callback:
+            self.system_callback(sample.cpu, sample.mem)
+        if self.batch_callback and sample.processes:
+            self.batch_callback(sample.processes)
+        if self._psproc and self.process_callback:
+            r = sample.processes.get(self._psproc.pid)
+            if r is None:
+                self.process_callback(0.0, 0.0)
+            else:
+                self.process_callback(r["cpu"], r["mem"])
+
     def start(self):
         if self._running:
             return
@@ -31,19 +164,13 @@ class ResourceMonitor:
         self._running = False
 
     def _loop(self):
+        next_tick = time.monotonic()
         while self._running:
-            cpu = psutil.cpu_percent(interval=None)
-            mem = psutil.virtual_memory().percent
-            if self.system_callback:
-                self.system_callback(cpu, mem)
-            if self._psproc:
-                try:
-                    # cpu_percent with interval=0.1 to get instant-ish value
-                    proc_cpu = self._psproc.cpu_percent(interval=0.1)
-                    proc_mem = self._psproc.memory_percent()
-                except Exception:
-                    proc_cpu, proc_mem = 0.0, 0.0
-                if self.process_callback:
-                    self.process_callback(proc_cpu, proc_mem)
-            time.sleep(self.poll_interval)
-
+            self.publish(self.sample())
+            # sleep to the next tick so sampling cost does not stretch the interval
+            next_tick += self.poll_interval
+            delay = next_tick - time.monotonic()
+            if delay < 0:
+                next_tick = time.monotonic()
+                delay = 0
+            time.sleep(delay)
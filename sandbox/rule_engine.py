@@ -0,0 +1,232 @@
+# sandbox/rule_engine.py
+"""
+Declarative rules evaluated on the ResourceMonitor's sample stream.
+
+A rule pairs a condition with an action on the watched process:
+
+    {"name": "hot",   "metric": "cpu", "above": 90, "for": 30, "action": "renice", "arg": 10}
+    {"name": "leak",  "metric": "rss", "growth": 52428800, "per": 60, "action": "terminate"}
+    {"name": "stuck", "silent_for": 300, "action": "suspend", "arg": 60}
+
+Conditions: threshold held for a duration (above/below + for), growth of a
+metric per `per` seconds, and no session output for `silent_for` seconds.
+Actions (through ProcessControl): renice (nice value or priority name),
+shrink_affinity (keep `arg` cores, default half), suspend (resume after `arg`
+seconds if given), resume, terminate, kill, log.
+
+Each condition keeps a few numbers of state per watched process, so a sample
+costs O(1) per rule (the growth window is a deque trimmed as it slides). A rule
+fires once when its condition becomes true and re-arms when it clears, or
+again after `cooldown` seconds if it stays true.
+"""
+import json
+import threading
+from collections import deque
+
+import psutil
+
+from sandbox.process_control import ProcessControl
+
+ACTIONS = ("renice", "shrink_affinity", "suspend", "resume", "terminate", "kill", "log")
+
+
+class Threshold:
+    """metric above/below a value for at least `duration` seconds."""
+    def __init__(self, metric, above=None, below=None, duration=0.0):
+        self.metric = metric
+        self.above = above
+        self.below = below
+        self.duration = duration
+
+    def new_state(self):
+        return {"since": None}
+
+    def update(self, state, ts, reading, session):
+        value = reading.get(self.metric)
+        hit = value is not None and (
+            (self.above is not None and value > self.above) or (self.below is not None and value < self.below))
+        if not hit:
+            state["since"] = None
+            return False
+        if state["since"] is None:
+            state["since"] = ts
+        return ts - state["since"] >= self.duration
+
+
+class Growth:
+    """metric grew by more than `rate` per `per` seconds, measured over the last `per` seconds."""
+    def __init__(self, metric, rate, per=60.0):
+        self.metric = metric
+        self.rate = rate
+        self.per = per
+
+    def new_state(self):
+        return {"points": deque()}
+
+    def update(self, state, ts, reading, session):
+        value = reading.get(self.metric)
+        if value is None:
+            return False
+        points = state["points"]
+        points.append((ts, value))
+        # keep one point at or before the window start as the anchor
+        while len(points) > 2 and points[1][0] <= ts - self.per:
+            points.popleft()
+        t0, v0 = points[0]
+        if ts - t0 < self.per:
+            return False
+        return (value - v0) / (ts - t0) * self.per > self.rate
+
+
+class Silence:
+    """
+    no output from the session for `duration` seconds (counted from launch
+    before any output). Needs a session: a pid attached from outside has no
+    output to watch, so the engine does not apply these rules to it.
+    """
+    needs_session = True
+
+    def __init__(self, duration):
+        self.duration = duration
+
+    def new_state(self):
+        return {"first_seen": None}
+
+    def update(self, state, ts, reading, session):
+        if state["first_seen"] is None:
+            state["first_seen"] = ts
+        last = getattr(session, "last_output", None) or getattr(session, "started", None) or state["first_seen"]
+        return ts - last >= self.duration
+
+
+class Rule:
+    def __init__(self, name, condition, action, arg=None, cooldown=None):
+        if action not in ACTIONS:
+            raise ValueError(f"Unknown rule action: {action}")
+        self.name = name
+        self.condition = condition
+        self.action = action
+        self.arg = arg
+        self.cooldown = cooldown
+
+    @classmethod
+    def from_dict(cls, d):
+        d = dict(d)
+        if "silent_for" in d:
+            condition = Silence(float(d["silent_for"]))
+        elif "growth" in d:
+            condition = Growth(d["metric"], float(d["growth"]), float(d.get("per", 60)))
+        elif "above" in d or "below" in d:
+            condition = Threshold(d["metric"], d.get("above"), d.get("below"), float(d.get("for", 0)))
+        else:
+            raise ValueError(f"Rule {d.get('name', '?')!r} has no condition (above/below, growth or silent_for)")
+        return cls(d.get("name") or d["action"], condition, d["action"], d.get("arg"), d.get("cooldown"))
+
+
+def load_rules(path):
+    """Rules from a JSON file holding a list of rule dicts (or {"rules": [...]})."""
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    if isinstance(data, dict):
+        data = data.get("rules", [])
+    return [Rule.from_dict(d) for d in data]
+
+
+class RuleEngine:
+    """
+    Evaluates rules for watched pids on every monitor sample; subscribe it with
+    monitor.subscribe(engine.on_sample). A fired rule is recorded as a
+    "rule_fired" event on the watched session, or passed to
+    event_callback(event) for a pid watched without one.
+    """
+    def __init__(self, rules=(), event_callback=None):
+        self.rules = [r if isinstance(r, Rule) else Rule.from_dict(r) for r in rules]
+        self.event_callback = event_callback
+        self._watched = {}      # pid -> {"rules", "session", "states", "control"}
+        self._lock = threading.Lock()
+
+    def watch(self, pid, rules=None, session=None):
+        """
+        Apply `rules` (default: the engine's rules) to pid, e.g. a session's root
+        process. Without a session, silence rules are left out; returns False
+        if nothing is watched.
+        """
+        rules = self.rules if rules is None else [r if isinstance(r, Rule) else Rule.from_dict(r) for r in rules]
+        if session is None:
+            rules = [r for r in rules if not getattr(r.condition, "needs_session", False)]
+        if not rules:
+            return False
+        control = ProcessControl()
+        try:
+            control.set_process(psutil.Process(pid))
+        except psutil.Error:
+            return False
+        with self._lock:
+            self._watched[pid] = {"rules": rules, "session": session, "control": control,
+                                  "states": [[r.condition.new_state(), None] for r in rules]}
+        return True
+
+    def unwatch(self, pid):
+        with self._lock:
+            self._watched.pop(pid, None)
+
+    def watched(self):
+        with self._lock:
+            return list(self._watched)
+
+    def on_sample(self, sample):
+        with self._lock:
+            entries = list(self._watched.items())
+        for pid, entry in entries:
+            reading = sample.processes.get(pid)
+            if reading is None:
+                continue
+            for rule, slot in zip(entry["rules"], entry["states"]):
+                state, fired_at = slot
+                if not rule.condition.update(state, sample.ts, reading, entry["session"]):
+                    slot[1] = None      # condition cleared: re-arm
+                    continue
+                if fired_at is not None and (rule.cooldown is None or sample.ts - fired_at < rule.cooldown):
+                    continue
+                slot[1] = sample.ts
+                self._fire(rule, pid, entry, reading, sample.ts)
+
+    def _fire(self, rule, pid, entry, reading, ts):
+        event = {"type": "rule_fired", "rule": rule.name, "action": rule.action, "pid": pid, "ts": ts}
+        if rule.arg is not None:
+            event["arg"] = rule.arg
+        metric = getattr(rule.condition, "metric", None)
+        if metric and metric in reading:
+            event["value"] = reading[metric]
+        try:
+            self._act(rule, entry["control"])
+        except Exception as e:
+            event["error"] = str(e)
+        session = entry["session"]
+        if session is not None:
+            session.add_event("rule_fired", **{k: v for k, v in event.items() if k not in ("type", "ts")})
+        elif self.event_callback:
+            try:
+                self.event_callback(event)
+            except Exception:
+                pass
+
+    @staticmethod
+    def _act(rule, control):
+        action, arg = rule.action, rule.arg
+        if action == "renice":
+            control.renice(arg if isinstance(arg, str) else 10 if arg is None else int(arg))
+        elif action == "shrink_affinity":
+            control.shrink_affinity(arg)
+        elif action == "suspend":
+            control.suspend()
+            if arg:
+                timer = threading.Timer(float(arg), control.resume)
+                timer.daemon = True
+                timer.start()
+        elif action == "resume":
+            control.resume()
+        elif action == "terminate":
+            control.terminate()
+        elif action == "kill":
+            control.kill()
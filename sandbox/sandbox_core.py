@@ -1,62 +1,428 @@
 # sandbox/sandbox_core.py
+import contextlib
 import subprocess
 import threading
 import tempfile
+import itertools
 import os
 import datetime
+import time
+import json
+import re
+import shlex
+import shutil
+
+from sandbox.stream_pump import StreamPump, STDOUT
+from sandbox.limits import ResourceLimits, CgroupV2
+from sandbox.workspace_pool import default_pool
+from sandbox.spawn import direct_argv, spawn_direct, spawn_shell
+from sandbox.log_sink import LogSink, housekeeper
+from sandbox.session_summary import SamplePeaks, build_summary
+from utils.instrumentation import metrics
+
+PYTHON_RE = re.compile(r"^python(\d+(\.\d+)?)?(\.exe)?$", re.I)
+
+LAUNCHES = metrics.counter("sandbox_launches", "Processes started, by launch path", ("path",))
+LAUNCH_FAILURES = metrics.counter("sandbox_launch_failures", "Sessions that failed to start")
+LAUNCH_SECONDS = metrics.histogram("sandbox_launch_seconds",
+                                   "Time from session start to a running process", ("path",))
+ACTIVE_SESSIONS = metrics.gauge("sandbox_active_sessions", "Sessions whose process is running")
+CALLBACK_QUEUE_DEPTH = metrics.gauge("sandbox_callback_queue_depth",
+                                     "Output batches queued for a consumer and not yet taken", ("queue",))
+
+
+class SandboxSession:
+    """
+    One command run inside the sandbox. Each session owns its working directory,
+    log file, process handle and exit status, so several can run side by side.
+    """
+    def __init__(self, session_id, command, cwd, log_path, limits=None, event_callback=None, log_budget=None):
+        self.session_id = session_id
+        self.command = command
+        self.cwd = cwd
+        self.log_path = log_path
+        self.process = None
+        self.returncode = None
+        self.error = None
+        self.status = "queued"
+        self.started = None
+        self.finished = None
+        self.limits = limits
+        self.log_budget = log_budget    # LogBudget for this session's log, or None
+        self.log_stats = None           # LogSink.stats() once the log is closed
+        self.events = []          # structured events, e.g. limit hits
+        self.last_output = None   # time of the latest output batch
+        self.peaks = SamplePeaks()  # maxima over monitor samples, see record_sample()
+        self.summary = None       # session_summary.build_summary() once finished
+        self._event_callback = event_callback
+        self._workspace_pool = None   # set when cwd was taken from a WorkspacePool
+        self._cgroup = None
+        self._done = threading.Event()
+
+    @property
+    def pid(self):
+        return self.process.pid if self.process else None
+
+    def is_running(self):
+        return self.process is not None and self.process.poll() is None
+
+    def is_done(self):
+        return self._done.is_set()
+
+    def wait(self, timeout=None):
+        """Block until the session finished; returns the exit code (None on timeout)."""
+        self._done.wait(timeout)
+        return self.returncode
+
+    def terminate(self):
+        if self.is_running():
+            self.process.terminate()
+            return True
+        return False
+
+    def record_sample(self, reading):
+        """Feed a monitor reading (ProcessTree aggregate) of this session's process into its peaks."""
+        self.peaks.add(reading)
+
+    def add_event(self, kind, **detail):
+        event = dict(detail, type=kind, ts=time.time(), session_id=self.session_id)
+        self.events.append(event)
+        if self._event_callback:
+            try:
+                self._event_callback(self, event)
+            except Exception:
+                pass
+        return event
+
+    @property
+    def meta_path(self):
+        return os.path.splitext(self.log_path)[0] + ".json"
+
+    def metadata(self):
+        return {
+            "session_id": self.session_id,
+            "command": self.command if isinstance(self.command, str) else subprocess.list2cmdline(self.command),
+            "cwd": self.cwd,
+            "log_path": self.log_path,
+            "pid": self.pid,
+            "status": self.status,
+            "exit_code": self.returncode,
+            "error": str(self.error) if self.error else None,
+            "started": self.started,
+            "finished": self.finished,
+            "limits": self.limits.as_dict() if self.limits else None,
+            "events": self.events,
+            "log": self.log_stats,
+            "summary": self.summary,
+        }
+
+    def save_metadata(self):
+        """Write the session's metadata next to its log (sandbox_log_*.json)."""
+        try:
+            with open(self.meta_path, "w", encoding="utf-8") as f:
+                json.dump(self.metadata(), f, indent=1)
+        except OSError:
+            pass
+
+    def _finish(self, status):
+        if self.status == "running":
+            ACTIVE_SESSIONS.dec()
+        self.status = status
+        self.finished = time.time()
+        self.summary = build_summary(self)
+        self.save_metadata()
+        if self._workspace_pool is not None:
+            self._workspace_pool.release(self.cwd)
+            self._workspace_pool = None
+        self._done.set()
+
+    def __repr__(self):
+        return f"<SandboxSession {self.session_id} {self.status} pid={self.pid} cmd={self.command!r}>"
+
 
 class Sandbox:
     """
     Runs a command inside a sandbox folder (temp directory).
-    Logs stdout/stderr to a file and calls a callback for each output line.
+    Logs stdout/stderr to a file and calls a callback for each output line
+    (or, with batch_callback, once per batch of timestamped lines).
     """
-    def __init__(self, output_callback):
-        self.process = None
+    def __init__(self, output_callback, reports_dir="reports", batch_callback=None, limits=None,
+                 event_callback=None, workspace_pool=None, zygote=None, log_budget=None, retention=None):
         self.output_callback = output_callback
+        self.batch_callback = batch_callback
+        self.limits = limits                    # default ResourceLimits for new sessions
+        self.log_budget = log_budget            # default LogBudget for new sessions
+        self.retention = retention              # LogRetention applied to reports_dir after each session
+        self._live_logs = set()
+        self.event_callback = event_callback    # called with (session, event)
+        self.reports_dir = reports_dir
         self.sandbox_dir = os.path.join(tempfile.gettempdir(), "sandbox_env")
         os.makedirs(self.sandbox_dir, exist_ok=True)
+        # every session gets a fresh, pre-staged directory under sandbox_dir, from the
+        # process-wide pool unless one is given (pools clean up at interpreter exit)
+        self.workspace_pool = workspace_pool or default_pool()
+        # optional fork-server: `python script.py ...` commands are forked from it
+        self.zygote = zygote
         self.current_log_path = None
+        self.current_session = None
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
 
-    def run_command(self, command):
-        def target():
+    @property
+    def process(self):
+        return self.current_session.process if self.current_session else None
+
+    def new_session(self, command, cwd=None, limits=None, log_budget=None):
+        """
+        Create a session with its own log file. Without an explicit cwd the
+        session gets a workspace from the pool when it launches; limits default
+        to the sandbox-wide ResourceLimits and log_budget to its LogBudget.
+        """
+        with self._lock:
+            session_id = next(self._ids)
+        os.makedirs(self.reports_dir, exist_ok=True)
+        log_path = self._reserve_log_path()
+        return SandboxSession(session_id, command, cwd, log_path,
+                              limits=limits or self.limits, event_callback=self.event_callback,
+                              log_budget=log_budget or self.log_budget)
+
+    def acquire_workspace(self, session):
+        """Give a session without a cwd its own workspace; it is released when the session ends."""
+        if session.cwd is None:
+            session.cwd = self.workspace_pool.acquire()
+            session._workspace_pool = self.workspace_pool
+        return session.cwd
+
+    def _reserve_log_path(self):
+        # several sessions may start within the same second: create the file exclusively
+        stamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
+        for n in itertools.count():
+            suffix = f"_{n}" if n else ""
+            path = os.path.join(self.reports_dir, f"sandbox_log_{stamp}{suffix}.txt")
             try:
-                # create reports folder and log file
-                os.makedirs("reports", exist_ok=True)
-                log_name = f"sandbox_log_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.txt"
-                self.current_log_path = os.path.join("reports", log_name)
-                self.output_callback(f"[Sandbox Dir] {self.sandbox_dir}")
-                with open(self.current_log_path, "w", encoding="utf-8") as logf:
-                    # Launch process inside sandbox_dir
-                    self.process = subprocess.Popen(
-                        command,
-                        cwd=self.sandbox_dir,
-                        shell=True,
-                        stdout=subprocess.PIPE,
-                        stderr=subprocess.PIPE,
-                        text=True,
-                        bufsize=1,
-                        universal_newlines=True
-                    )
-                    # Read stdout line by line
-                    for line in self.process.stdout:
-                        if line is None:
-                            break
-                        line = line.rstrip("\n")
-                        logf.write(line + "\n")
-                        logf.flush()
-                        self.output_callback(line)
-                    # read remaining stderr
-                    err = self.process.stderr.read()
-                    if err:
-                        for l in err.splitlines():
-                            logf.write(l + "\n")
-                            self.output_callback(f"ERR: {l}")
-                    self.output_callback(f"[Log saved at] {self.current_log_path}")
-            except Exception as ex:
-                self.output_callback(f"[Sandbox error] {ex}")
-
-        th = threading.Thread(target=target, daemon=True)
+                fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                continue
+            os.close(fd)
+            return path
+
+    def execute(self, session, output_callback=None, batch_callback=None, start_callback=None, direct=False):
+        """
+        Run a session to completion on the calling thread. Output goes to
+        batch_callback as lists of (timestamp, stream, line) when given,
+        otherwise line by line to output_callback. start_callback(session) is
+        called as soon as the process exists, before any output is read.
+        direct=True execs commands that need no shell without /bin/sh.
+        """
+        emit = output_callback or self.output_callback
+        batch_emit = batch_callback or self.batch_callback
+        if self._start(session, emit, direct):
+            if start_callback:
+                start_callback(session)
+            self._complete(session, emit, batch_emit)
+        return session
+
+    def launch(self, command, cwd=None, limits=None, output_callback=None, batch_callback=None,
+               exit_callback=None, done_callback=None):
+        """
+        Start a command without a shell where possible and return its session as
+        soon as the process exists, so the caller can attach to session.pid
+        right away. exit_callback(session) fires when the process exits (the
+        moment it happens for direct launches, after the output is drained
+        otherwise); done_callback(session) once the session is finished. Output is pumped on a background thread.
+        """
+        emit = output_callback or self.output_callback
+        batch_emit = batch_callback or self.batch_callback
+        session = self.new_session(command, cwd=cwd, limits=limits)
+        self.current_session = session
+        self.current_log_path = session.log_path
+        reported = threading.Event()
+
+        def on_exit(proc=None):
+            if proc is not None and session.returncode is None:
+                # watcher thread, before _complete: callers should see the exit code already
+                session.returncode = proc.returncode
+            if exit_callback and not reported.is_set():
+                reported.set()
+                exit_callback(session)
+        if self._start(session, emit, direct=True, on_exit=on_exit):
+            def complete():
+                self._complete(session, emit, batch_emit)
+                on_exit()       # shell and fork-server launches learn of the exit here
+                if done_callback:
+                    done_callback(session)
+            threading.Thread(target=complete, daemon=True, name=f"session-{session.session_id}").start()
+        elif done_callback:
+            done_callback(session)
+        return session
+
+    def _start(self, session, emit, direct=False, on_exit=None):
+        """Create the session's process; on failure the session is finished as failed."""
+        session.status = "running"
+        session.started = time.time()
+        ACTIVE_SESSIONS.inc()
+        t0 = time.perf_counter()
+        try:
+            self.acquire_workspace(session)
+            emit(f"[Sandbox Dir] {session.cwd}")
+            preexec, session._cgroup = self._prepare_limits(session)
+            zygote_argv = self._zygote_argv(session.command)
+            argv = direct_argv(session.command, session.cwd) if direct and not zygote_argv else None
+            if zygote_argv:
+                path = "zygote"
+                session.process = self.zygote.spawn(zygote_argv[1], zygote_argv[2:], cwd=session.cwd,
+                                                    limits=session.limits, cgroup=session._cgroup)
+            elif argv:
+                path = "direct"
+                session.process = spawn_direct(argv, cwd=session.cwd, limits=session.limits,
+                                               cgroup=session._cgroup, on_exit=on_exit)
+            elif os.name != "nt":
+                path = "shell"
+                # Launch process inside the session's directory
+                session.process = spawn_shell(session.command, cwd=session.cwd, preexec_fn=preexec,
+                                              on_exit=on_exit)
+            else:
+                path = "shell"
+                session.process = subprocess.Popen(
+                    session.command,
+                    cwd=session.cwd,
+                    shell=True,
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.PIPE,
+                    bufsize=0
+                )
+            LAUNCHES.inc(path=path)
+            LAUNCH_SECONDS.observe(time.perf_counter() - t0, path=path)
+            return True
+        except Exception as ex:
+            LAUNCH_FAILURES.inc()
+            self._fail(session, ex, emit)
+            return False
+
+    def _complete(self, session, emit, batch_emit):
+        """Pump the started session's output into its log until exit, then finish it."""
+        try:
+            with self._live(session), LogSink(session.log_path, session.log_budget) as logf:
+                pump = StreamPump(session.process.stdout, session.process.stderr, logf,
+                                  lambda batch: self._deliver(batch, emit, batch_emit, session),
+                                  throttle=logf.throttle)
+                pump.run()
+                session.process.stdout.close()
+                session.process.stderr.close()
+                session.returncode = session.process.wait()
+                emit(f"[Log saved at] {session.log_path}")
+            self._record_log(session, logf)
+            self._collect_limit_events(session, session._cgroup)
+            session._finish("finished")
+        except Exception as ex:
+            self._fail(session, ex, emit)
+        finally:
+            if session._cgroup is not None:
+                session._cgroup.remove()
+                session._cgroup = None
+        return session
+
+    @contextlib.contextmanager
+    def _live(self, session):
+        self._track_live(session)
+        try:
+            yield
+        finally:
+            self._release_live(session)
+
+    def _track_live(self, session):
+        # live logs are never pruned; each finished session may push older ones out
+        with self._lock:
+            self._live_logs.add(session.log_path)
+
+    def _release_live(self, session):
+        with self._lock:
+            self._live_logs.discard(session.log_path)
+            keep = set(self._live_logs)
+        if self.retention is not None:
+            housekeeper().submit(self.retention.enforce, self.reports_dir, keep)
+
+    @staticmethod
+    def _record_log(session, logf):
+        """Keep the closed LogSink's stats on the session; note when it went over budget."""
+        session.log_stats = logf.stats()
+        if session.log_stats["over_budget"]:
+            session.add_event("log_over_budget", policy=session.log_stats["policy"],
+                              bytes_in=session.log_stats["bytes_in"],
+                              dropped_lines=session.log_stats["dropped_lines"])
+
+    @staticmethod
+    def _fail(session, ex, emit):
+        session.error = ex
+        emit(f"[Sandbox error] {ex}")
+        session._finish("failed")
+        if session._cgroup is not None and session.process is None:
+            session._cgroup.remove()
+            session._cgroup = None
+
+    def _zygote_argv(self, command):
+        """argv for a plain `python script.py args...` command when the fork-server can run it."""
+        if self.zygote is None or not isinstance(command, str) or not self.zygote.supported():
+            return None
+        try:
+            argv = shlex.split(command, posix=(os.name != "nt"))
+        except ValueError:
+            return None
+        if len(argv) < 2 or not PYTHON_RE.match(os.path.basename(argv[0])) or not argv[1].endswith(".py"):
+            return None
+        # the zygote runs its own interpreter: only take commands that name that same binary
+        exe = shutil.which(argv[0])
+        if exe is None or os.path.realpath(exe) != os.path.realpath(self.zygote.python):
+            return None
+        return argv
+
+    def _prepare_limits(self, session):
+        limits = session.limits
+        if limits is None or os.name == "nt":
+            return None, None
+        cgroup = None
+        if limits.wants_cgroup():
+            cgroup = CgroupV2.create(f"sandbox_{os.getpid()}_{session.session_id}", limits, limits.cgroup_root)
+            if cgroup is None:
+                session.add_event("cgroup_unavailable", cpu_quota=limits.cpu_quota, memory_max=limits.memory_max)
+        return limits.preexec_fn(cgroup), cgroup
+
+    @staticmethod
+    def _collect_limit_events(session, cgroup):
+        if session.limits is None:
+            return
+        for event in session.limits.exit_events(session.returncode):
+            session.add_event(event.pop("type"), **event)
+        if cgroup is not None:
+            for event in cgroup.events():
+                session.add_event(event.pop("type"), **event)
+
+    @staticmethod
+    def _deliver(batch, emit, batch_emit, session=None):
+        if session is not None and batch:
+            session.last_output = batch[-1][0]
+        if session is not None and session.limits is not None:
+            # stderr hints that the child hit an rlimit; reported once per kind
+            seen = {e["type"] for e in session.events}
+            for _, stream, line in batch:
+                if stream != STDOUT:
+                    kind = ResourceLimits.match_output(line)
+                    if kind and kind not in seen:
+                        seen.add(kind)
+                        session.add_event(kind, source="stderr", line=line[:200])
+        if batch_emit:
+            batch_emit(batch)
+            return
+        for _, stream, line in batch:
+            emit(line if stream == STDOUT else f"ERR: {line}")
+
+    def run_command(self, command):
+        session = self.new_session(command)
+        self.current_session = session
+        self.current_log_path = session.log_path
+        th = threading.Thread(target=self.execute, args=(session,), daemon=True)
         th.start()
+        return session
 
     def stop_process(self):
         if self.process and self.process.poll() is None:
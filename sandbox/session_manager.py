@@ -0,0 +1,104 @@
+# sandbox/session_manager.py
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from sandbox.sandbox_core import Sandbox
+
+
+class SessionManager:
+    """
+    Runs many sandbox sessions concurrently on a bounded pool of worker threads.
+    At most max_workers commands run at once; the rest wait in FIFO order.
+    Every session gets a private working directory from the sandbox's
+    WorkspacePool, which is kept at least max_workers deep.
+
+    output_callback is called with (session, line), batch_callback (if given)
+    with (session, [(timestamp, stream, line), ...]) instead, and
+    session_callback with (session) once its process has started and again
+    when it finishes.
+    """
+    def __init__(self, sandbox=None, max_workers=4, output_callback=None, session_callback=None,
+                 batch_callback=None):
+        self.sandbox = sandbox or Sandbox(lambda line: None)
+        self.max_workers = max_workers
+        self.output_callback = output_callback
+        self.session_callback = session_callback
+        self.batch_callback = batch_callback
+        self.sandbox.workspace_pool.resize(max_workers)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="sandbox-session")
+        self._sessions = []
+        self._futures = {}
+        self._lock = threading.Lock()
+
+    def submit(self, command, limits=None, log_budget=None):
+        """Queue a command (optionally with its own ResourceLimits/LogBudget); returns its SandboxSession immediately."""
+        session = self.sandbox.new_session(command, limits=limits, log_budget=log_budget)
+        with self._lock:
+            self._sessions.append(session)
+            self._futures[session.session_id] = self._executor.submit(self._run, session)
+        return session
+
+    def map(self, commands):
+        return [self.submit(cmd) for cmd in commands]
+
+    def _run(self, session):
+        if session.is_done():
+            return session
+        batch_emit = (lambda batch: self.batch_callback(session, batch)) if self.batch_callback else None
+        self.sandbox.execute(session, output_callback=lambda line: self._emit(session, line),
+                             batch_callback=batch_emit, start_callback=self._notify)
+        self._notify(session)
+        return session
+
+    def _emit(self, session, line):
+        if self.output_callback:
+            self.output_callback(session, line)
+
+    def _notify(self, session):
+        if self.session_callback:
+            try:
+                self.session_callback(session)
+            except Exception:
+                pass
+
+    def cancel(self, session):
+        """Drop a queued session, or terminate it if it is already running."""
+        fut = self._futures.get(session.session_id)
+        if fut is not None and fut.cancel():
+            session._finish("cancelled")
+            self._notify(session)
+            return True
+        return session.terminate()
+
+    def sessions(self):
+        with self._lock:
+            return list(self._sessions)
+
+    def running(self):
+        return [s for s in self.sessions() if s.status == "running"]
+
+    def pending(self):
+        return [s for s in self.sessions() if s.status == "queued"]
+
+    def wait_all(self, timeout=None):
+        """Wait for every submitted session; returns True if all finished in time."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for s in self.sessions():
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            s.wait(remaining)
+            if not s.is_done():
+                return False
+        return True
+
+    def shutdown(self, wait=True, cancel_pending=False):
+        if cancel_pending:
+            for s in self.pending():
+                self.cancel(s)
+        self._executor.shutdown(wait=wait)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown(wait=True)
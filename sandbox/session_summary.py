@@ -0,0 +1,119 @@
+# sandbox/session_summary.py
+"""
+End-of-run accounting for a session: the kernel's rusage for the exited
+child (wait4, exact and free), merged with peaks from monitor samples of the
+process tree and its I/O counters.
+
+On Linux a forked (or vforked) child inherits the launcher's RSS high-water
+mark through exec, so a wait4 max RSS no larger than the launcher's own at
+spawn time says nothing about the child; the sampled peak is used then and
+"max_rss_source" tells which one was. The launcher is this process for direct
+launches and the zygote for fork-server ones (process.launcher_maxrss).
+"""
+import sys
+
+# maxrss is reported in KiB on Linux and in bytes on macOS
+_MAXRSS_SCALE = 1 if sys.platform == "darwin" else 1024
+
+
+def rusage_dict(ru):
+    """Normalise a resource.struct_rusage, or the dict the fork-server sends, to one dict."""
+    if ru is None:
+        return None
+    if isinstance(ru, dict):
+        return {"cpu_user": round(ru.get("utime", 0.0), 6), "cpu_system": round(ru.get("stime", 0.0), 6),
+                "max_rss": int(ru.get("maxrss_kb", 0)) * 1024,
+                "minor_faults": ru.get("minflt", 0), "major_faults": ru.get("majflt", 0),
+                "voluntary_switches": ru.get("nvcsw", 0), "involuntary_switches": ru.get("nivcsw", 0),
+                "block_reads": ru.get("inblock", 0), "block_writes": ru.get("oublock", 0)}
+    return {"cpu_user": round(ru.ru_utime, 6), "cpu_system": round(ru.ru_stime, 6),
+            "max_rss": ru.ru_maxrss * _MAXRSS_SCALE,
+            "minor_faults": ru.ru_minflt, "major_faults": ru.ru_majflt,
+            "voluntary_switches": ru.ru_nvcsw, "involuntary_switches": ru.ru_nivcsw,
+            "block_reads": ru.ru_inblock, "block_writes": ru.ru_oublock}
+
+
+class SamplePeaks:
+    """Running maxima over monitor readings (ProcessTree aggregates) of one session."""
+    def __init__(self):
+        self.samples = 0
+        self.peak_rss = 0
+        self.peak_cpu_percent = 0.0
+        self.peak_threads = 0
+        self.peak_fds = 0
+        self.cpu_time = 0.0
+        self.io_read_bytes = 0
+        self.io_write_bytes = 0
+
+    def add(self, reading):
+        self.samples += 1
+        self.peak_rss = max(self.peak_rss, reading.get("rss", 0))
+        self.peak_cpu_percent = max(self.peak_cpu_percent, reading.get("cpu", 0.0))
+        self.peak_threads = max(self.peak_threads, reading.get("threads", 0))
+        self.peak_fds = max(self.peak_fds, reading.get("fds", 0))
+        # cumulative counters: the latest (largest) value is the total so far
+        self.cpu_time = max(self.cpu_time, reading.get("cpu_time", 0.0))
+        self.io_read_bytes = max(self.io_read_bytes, reading.get("read_bytes", 0))
+        self.io_write_bytes = max(self.io_write_bytes, reading.get("write_bytes", 0))
+
+
+def build_summary(session):
+    """Structured summary of a finished session (see SandboxSession.summary)."""
+    started, finished = session.started, session.finished
+    wall = round(finished - started, 6) if started and finished else None
+    peaks = session.peaks
+    kernel = rusage_dict(getattr(session.process, "rusage", None))
+    summary = {"status": session.status, "exit_code": session.returncode, "wall_time": wall,
+               "source": "wait4" if kernel else ("sampled" if peaks.samples else None)}
+    sampled_rss = peaks.peak_rss if peaks.samples else None
+    if kernel:
+        summary.update(kernel)
+        summary["cpu_time"] = round(kernel["cpu_user"] + kernel["cpu_system"], 6)
+        baseline = getattr(session.process, "launcher_maxrss", None)
+        if baseline is not None and kernel["max_rss"] <= baseline * _MAXRSS_SCALE:
+            # only the inherited high-water mark: the child never grew past the launcher
+            summary["max_rss"], summary["max_rss_source"] = sampled_rss, "sampled" if peaks.samples else None
+        else:
+            # a sampled tree (e.g. children still running at exit) can exceed the waited child's own peak
+            summary["max_rss"] = max(kernel["max_rss"], sampled_rss or 0)
+            summary["max_rss_source"] = "sampled" if (sampled_rss or 0) > kernel["max_rss"] else "wait4"
+    else:
+        summary["cpu_time"] = round(peaks.cpu_time, 6)
+        summary["max_rss"], summary["max_rss_source"] = sampled_rss, "sampled" if peaks.samples else None
+    if wall:
+        summary["cpu_avg_percent"] = round(100.0 * summary["cpu_time"] / wall, 1)
+    summary.update({"samples": peaks.samples, "peak_cpu_percent": peaks.peak_cpu_percent,
+                    "peak_threads": peaks.peak_threads, "peak_fds": peaks.peak_fds,
+                    "io_read_bytes": peaks.io_read_bytes, "io_write_bytes": peaks.io_write_bytes})
+    return summary
+
+
+def format_summary(summary):
+    """[(label, text), ...] for reports and the log view."""
+    if not summary:
+        return []
+
+    def mb(n):
+        return f"{n / 1024 / 1024:.1f} MB"
+    out = [("Exit code", str(summary.get("exit_code"))),
+           ("Wall time", f"{summary['wall_time']:.3f} s" if summary.get("wall_time") is not None else "n/a")]
+    if summary.get("cpu_user") is not None:
+        out.append(("CPU time", f"{summary['cpu_time']:.3f} s (user {summary['cpu_user']:.3f}, "
+                                f"sys {summary['cpu_system']:.3f})"))
+    else:
+        out.append(("CPU time", f"{summary['cpu_time']:.3f} s (sampled)"))
+    if summary.get("cpu_avg_percent") is not None:
+        peak = f" / {summary['peak_cpu_percent']:.1f}% peak" if summary.get("samples") else ""
+        out.append(("CPU average", f"{summary['cpu_avg_percent']:.1f}%{peak}"))
+    if summary.get("max_rss") is not None:
+        out.append(("Max RSS", f"{mb(summary['max_rss'])} ({summary.get('max_rss_source')})"))
+    else:
+        out.append(("Max RSS", "n/a (not sampled)"))
+    if summary.get("minor_faults") is not None:
+        out.append(("Page faults", f"{summary['minor_faults']} minor, {summary['major_faults']} major"))
+        out.append(("Context switches", f"{summary['voluntary_switches']} voluntary, "
+                                        f"{summary['involuntary_switches']} involuntary"))
+        out.append(("Block I/O", f"{summary['block_reads']} in, {summary['block_writes']} out"))
+    if summary.get("io_read_bytes") or summary.get("io_write_bytes"):
+        out.append(("I/O (sampled)", f"read {mb(summary['io_read_bytes'])}, write {mb(summary['io_write_bytes'])}"))
+    return out
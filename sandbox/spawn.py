@@ -0,0 +1,203 @@
+# sandbox/spawn.py
+"""
+Shell-free launch path: a command that needs no shell features is split into
+argv and exec'd directly, so the session's pid is the program itself rather
+than a /bin/sh wrapper. Exits are picked up by a shared ExitWatcher that
+sleeps on pidfds instead of polling.
+"""
+import os
+import re
+import selectors
+import shlex
+import shutil
+import subprocess
+import threading
+
+try:
+    import resource
+except ImportError:       # Windows
+    resource = None
+
+# anything a shell would have to interpret keeps the command on the shell path
+SHELL_CHARS = re.compile(r"[|&;<>()$`\\*?\[\]{}~!#\n]")
+# POSIX special and regular builtins, plus the common bash ones: no binary to exec
+SHELL_BUILTINS = frozenset((
+    ".", ":", "alias", "bg", "break", "builtin", "cd", "command", "continue", "declare", "dirs", "eval",
+    "exec", "exit", "export", "fc", "fg", "getopts", "hash", "jobs", "let", "local", "popd", "pushd",
+    "read", "readonly", "return", "set", "shift", "source", "times", "trap", "type", "typeset", "ulimit",
+    "umask", "unalias", "unset", "wait",
+))
+
+
+def direct_argv(command, cwd=None):
+    """
+    argv for a command that needs no shell, or None if it does (always on
+    Windows): shell syntax, a shell builtin, or a program that cannot be
+    found. A relative path in argv[0] is looked up from cwd.
+    """
+    if os.name == "nt":
+        return None         # no wait4 there to reap with; Popen handles it
+    if isinstance(command, (list, tuple)):
+        return list(command)
+    if SHELL_CHARS.search(command):
+        return None
+    try:
+        argv = shlex.split(command)
+    except ValueError:
+        return None
+    if not argv or "=" in argv[0] or argv[0] in SHELL_BUILTINS:    # VAR=value cmd needs the shell too
+        return None
+    if os.sep in argv[0]:
+        program = os.path.join(cwd, argv[0]) if cwd else argv[0]
+        found = os.path.isfile(program) and os.access(program, os.X_OK)
+    else:
+        found = shutil.which(argv[0]) is not None
+    # let the shell report a missing program the usual way (exit 127) rather than fail the launch
+    return argv if found else None
+
+
+class DirectProcess(subprocess.Popen):
+    """
+    Popen whose exit is reaped by the ExitWatcher (with wait4, so rusage comes
+    along). poll() and wait() read the watcher's result and never call waitpid
+    themselves, so a GUI poll cannot steal the exit status from the watcher.
+    """
+    def __init__(self, *args, **kwargs):
+        self.rusage = None
+        self.exited = threading.Event()
+        # the child's ru_maxrss starts at (at most) our own high-water mark, carried through exec
+        self.launcher_maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss if resource else None
+        super().__init__(*args, **kwargs)
+
+    def poll(self):
+        return self.returncode
+
+    def wait(self, timeout=None):
+        if not self.exited.wait(timeout):
+            raise subprocess.TimeoutExpired(self.args, timeout)
+        return self.returncode
+
+
+def spawn_direct(argv, cwd=None, limits=None, cgroup=None, on_exit=None):
+    """
+    Exec argv without a shell and start watching it; returns a DirectProcess.
+    Without limits CPython launches through vfork+exec. With limits the child
+    joins the cgroup and sets its rlimits in a preexec_fn, i.e. before exec:
+    limiting the pid after launch (prlimit) would leave it running unlimited
+    for a moment.
+    """
+    proc = DirectProcess(
+        argv,
+        cwd=cwd,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        bufsize=0,
+        preexec_fn=limits.preexec_fn(cgroup) if limits is not None else None,
+    )
+    exit_watcher().watch(proc, on_exit)
+    return proc
+
+
+def spawn_shell(command, cwd=None, preexec_fn=None, on_exit=None):
+    """Run command through the shell, reaped by the ExitWatcher so its rusage is kept too."""
+    proc = DirectProcess(
+        command,
+        cwd=cwd,
+        shell=True,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        bufsize=0,
+        preexec_fn=preexec_fn,
+    )
+    exit_watcher().watch(proc, on_exit)
+    return proc
+
+
+class ExitWatcher:
+    """
+    Reaps watched children the moment they exit. One thread sleeps on a pidfd
+    per child (Linux 5.3+); elsewhere each child gets a thread blocked in
+    wait4(). The exit status and rusage are stored on the process, its `exited`
+    event is set and callback(proc) runs on the watcher thread.
+    """
+    def __init__(self):
+        self._sel = None
+        self._lock = threading.Lock()
+        self._wake_w = None
+        self._thread = None
+
+    def watch(self, proc, callback=None):
+        pidfd = None
+        if hasattr(os, "pidfd_open"):
+            try:
+                pidfd = os.pidfd_open(proc.pid)
+            except OSError:
+                pidfd = None
+        if pidfd is None:
+            threading.Thread(target=self._reap, args=(proc, callback), daemon=True).start()
+            return
+        self._ensure_thread()
+        with self._lock:
+            self._sel.register(pidfd, selectors.EVENT_READ, (proc, callback))
+        os.write(self._wake_w, b"x")
+
+    def _ensure_thread(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._sel = selectors.DefaultSelector()
+            wake_r, self._wake_w = os.pipe()
+            os.set_blocking(wake_r, False)
+            self._sel.register(wake_r, selectors.EVENT_READ, None)
+            self._thread = threading.Thread(target=self._loop, args=(wake_r,), daemon=True,
+                                            name="exit-watcher")
+            self._thread.start()
+
+    def _loop(self, wake_r):
+        while True:
+            for key, _ in self._sel.select():
+                if key.data is None:
+                    # a new pidfd was registered; select() picks it up next round
+                    try:
+                        os.read(wake_r, 4096)
+                    except BlockingIOError:
+                        pass
+                    continue
+                with self._lock:
+                    self._sel.unregister(key.fd)
+                os.close(key.fd)
+                # readable pidfd: the child is a zombie, so wait4 returns at once
+                self._reap(*key.data)
+
+    @staticmethod
+    def _reap(proc, callback):
+        try:
+            if hasattr(os, "wait4"):
+                _, status, proc.rusage = os.wait4(proc.pid, 0)
+                code = os.waitstatus_to_exitcode(status)
+            else:
+                code = subprocess.Popen.wait(proc)     # no rusage on this platform
+        except ChildProcessError:
+            code = 0        # reaped elsewhere; Popen reports 0 as well
+        if proc.returncode is None:
+            proc.returncode = code
+        proc.exited.set()
+        if callback:
+            try:
+                callback(proc)
+            except Exception:
+                pass
+
+
+_watcher = None
+_watcher_lock = threading.Lock()
+
+
+def exit_watcher():
+    """The process-wide ExitWatcher."""
+    global _watcher
+    with _watcher_lock:
+        if _watcher is None:
+            _watcher = ExitWatcher()
+        return _watcher
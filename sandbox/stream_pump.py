@@ -0,0 +1,175 @@
+# sandbox/stream_pump.py
+import codecs
+import os
+import queue
+import threading
+import time
+
+from utils.instrumentation import metrics
+
+STDOUT = "stdout"
+STDERR = "stderr"
+
+PUMPED_LINES = metrics.counter("sandbox_output_lines", "Output lines pumped from sandboxed processes")
+PUMPED_BYTES = metrics.counter("sandbox_output_bytes", "Raw output bytes read from sandboxed processes")
+
+
+class StreamPump:
+    """
+    Drains a child's stdout and stderr pipes together so neither can fill up and
+    stall the child. Lines keep their arrival order and carry a timestamp; they are
+    handed to batch_callback as lists of (timestamp, stream, line) tuples.
+    Log writes are buffered and flushed once flush_bytes are pending or
+    flush_interval seconds have passed, whichever comes first.
+
+    Pipes may be None: callers with their own readers (e.g. asyncio) can push
+    raw chunks through feed() and call maybe_flush()/flush() themselves.
+
+    A logf with write_lines() (LogSink) gets the lines directly. throttle() is
+    asked after every read for seconds to stop reading, which leaves the pipes
+    full and so blocks the child (log backpressure).
+    """
+    def __init__(self, stdout, stderr, logf=None, batch_callback=None,
+                 flush_bytes=64 * 1024, flush_interval=0.25, read_size=64 * 1024,
+                 max_line=1024 * 1024, throttle=None):
+        self.streams = {STDOUT: stdout, STDERR: stderr}
+        self.logf = logf
+        self.batch_callback = batch_callback
+        self.flush_bytes = flush_bytes
+        self.flush_interval = flush_interval
+        self.read_size = read_size
+        self.max_line = max_line
+        self.throttle = throttle
+        self._write_lines = getattr(logf, "write_lines", None)
+        self.lines = 0
+        self.bytes = 0
+        self._counted_bytes = 0     # part of self.bytes already added to PUMPED_BYTES
+        self._decoders = {name: codecs.getincrementaldecoder("utf-8")(errors="replace") for name in self.streams}
+        self._partial = {name: "" for name in self.streams}
+        self._batch = []
+        self._pending_bytes = 0
+        # output after a quiet spell is delivered at once; only bursts are coalesced
+        self._last_flush = float("-inf")
+
+    def run(self):
+        """Pump until both pipes reach EOF, then flush whatever is left."""
+        try:
+            if os.name == "nt":
+                self._run_threaded()
+            else:
+                self._run_selector()
+        finally:
+            for name in self.streams:
+                self.feed(name, b"", final=True)
+            self.flush()
+
+    # ---------- readers ----------
+    def _run_selector(self):
+        import selectors
+        sel = selectors.DefaultSelector()
+        for name, pipe in self.streams.items():
+            if pipe is not None:
+                os.set_blocking(pipe.fileno(), False)
+                sel.register(pipe.fileno(), selectors.EVENT_READ, name)
+        try:
+            while sel.get_map():
+                for key, _ in sel.select(timeout=self.flush_interval):
+                    try:
+                        data = os.read(key.fd, self.read_size)
+                    except BlockingIOError:
+                        continue
+                    if not data:
+                        sel.unregister(key.fd)
+                        continue
+                    self.feed(key.data, data)
+                self.maybe_flush()
+                self._pause()
+        finally:
+            sel.close()
+
+    def _run_threaded(self):
+        # pipes cannot be selected on Windows; one reader thread per pipe feeds a queue
+        # (bounded, so a paused consumer stops the readers too)
+        q = queue.Queue(maxsize=16)
+
+        def reader(name, pipe):
+            try:
+                for data in iter(lambda: pipe.read1(self.read_size) if hasattr(pipe, "read1")
+                                 else pipe.read(self.read_size), b""):
+                    q.put((name, data))
+            finally:
+                q.put((name, None))
+
+        open_streams = 0
+        for name, pipe in self.streams.items():
+            if pipe is not None:
+                threading.Thread(target=reader, args=(name, pipe), daemon=True).start()
+                open_streams += 1
+        while open_streams:
+            try:
+                name, data = q.get(timeout=self.flush_interval)
+            except queue.Empty:
+                self.maybe_flush()
+                continue
+            if data is None:
+                open_streams -= 1
+            else:
+                self.feed(name, data)
+            self.maybe_flush()
+            self._pause()
+
+    def _pause(self):
+        if self.throttle is None:
+            return
+        delay = self.throttle()
+        if delay > 0:
+            self.flush()
+            time.sleep(min(delay, 1.0))
+
+    # ---------- line assembly & batching ----------
+    def feed(self, name, data, final=False):
+        """Add raw bytes read from stream `name`; final=True drains the partial line."""
+        self.bytes += len(data)
+        text = self._partial[name] + self._decoders[name].decode(data, final)
+        parts = text.split("\n")
+        rest = parts.pop()
+        if final and rest:
+            parts.append(rest)
+            rest = ""
+        elif len(rest) > self.max_line:
+            parts.append(rest)
+            rest = ""
+        self._partial[name] = rest
+        if not parts:
+            return
+        ts = time.time()
+        for line in parts:
+            line = line.rstrip("\r")
+            self._batch.append((ts, name, line))
+            self._pending_bytes += len(line) + 1
+        self.lines += len(parts)
+
+    def maybe_flush(self):
+        if self._pending_bytes >= self.flush_bytes or \
+                (self._batch and time.monotonic() - self._last_flush >= self.flush_interval):
+            self.flush()
+
+    def flush(self):
+        self._last_flush = time.monotonic()
+        if self.bytes != self._counted_bytes:
+            # metrics are updated per flush, not per read
+            PUMPED_BYTES.inc(self.bytes - self._counted_bytes)
+            self._counted_bytes = self.bytes
+        if not self._batch:
+            return
+        batch, self._batch = self._batch, []
+        PUMPED_LINES.inc(len(batch))
+        self._pending_bytes = 0
+        if self._write_lines is not None:
+            self._write_lines([line for _, _, line in batch])
+            self.logf.flush()
+        elif self.logf is not None:
+            self.logf.write("".join(line + "\n" for _, _, line in batch))
+            self.logf.flush()
+        if self.batch_callback:
+            self.batch_callback(batch)
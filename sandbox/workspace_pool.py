@@ -0,0 +1,200 @@
+# sandbox/workspace_pool.py
+import atexit
+import errno
+import os
+import shutil
+import stat
+import tempfile
+import threading
+import time
+from collections import deque
+
+try:
+    import fcntl
+except ImportError:       # Windows
+    fcntl = None
+
+FICLONE = 0x40049409      # Linux ioctl: share extents copy-on-write (btrfs, xfs, ...)
+MAX_BACKOFF = 30.0        # seconds between refill attempts while staging keeps failing
+
+
+class WorkspacePool:
+    """
+    Keeps `size` fresh per-session directories under `root` ready ahead of time.
+    Each is staged from an optional template tree; a background thread refills
+    the pool and deletes released workspaces, so neither setup nor cleanup sits
+    on the launch path.
+
+    link_mode decides how template files are staged:
+      "auto"     - reflink (copy-on-write clone) where the filesystem supports it, else copy
+      "hardlink" - hardlink, falling back to reflink/copy; only safe for read-only inputs,
+                   since a child writing a hardlinked file changes the template too
+      "copy"     - always copy
+    Only regular files, directories and symlinks are staged; FIFOs, sockets
+    and device nodes in the template are skipped.
+
+    Started pools close themselves at interpreter exit; default_pool() is the
+    one pool shared by every Sandbox in the process.
+    """
+    def __init__(self, root=None, size=2, template=None, link_mode="auto", keep=False):
+        self.root = root or os.path.join(tempfile.gettempdir(), "sandbox_env")
+        self.size = size
+        self.template = template
+        self.link_mode = link_mode
+        self.keep = keep                # keep released workspaces instead of deleting them
+        os.makedirs(self.root, exist_ok=True)
+        self._ready = deque()
+        self._dispose = deque()
+        self._cond = threading.Condition()
+        self._running = False
+        self._reflink_ok = fcntl is not None and hasattr(os, "uname") and os.uname().sysname == "Linux"
+        self._thread = None
+
+    def start(self):
+        with self._cond:
+            if self._running:
+                return self
+            self._running = True
+        self._thread = threading.Thread(target=self._loop, daemon=True, name="workspace-pool")
+        self._thread.start()
+        atexit.register(self.close)
+        return self
+
+    def resize(self, size):
+        with self._cond:
+            self.size = max(self.size, size)
+            self._cond.notify()
+
+    def acquire(self):
+        """A ready workspace path; staged on the spot only if the pool ran dry."""
+        self.start()
+        with self._cond:
+            path = self._ready.popleft() if self._ready else None
+            self._cond.notify()
+        return path or self._create()
+
+    def release(self, path):
+        """Hand a used workspace back; it is deleted in the background (at once after close())."""
+        if self.keep or not path:
+            return
+        with self._cond:
+            if self._running:
+                self._dispose.append(path)
+                self._cond.notify()
+                return
+        shutil.rmtree(path, ignore_errors=True)
+
+    def close(self):
+        """Stop the refill thread and delete ready and released workspaces."""
+        with self._cond:
+            self._running = False
+            leftovers = list(self._ready) + list(self._dispose)
+            self._ready.clear()
+            self._dispose.clear()
+            self._cond.notify()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            # let a staging in progress finish; it deletes its own result once it sees we stopped
+            self._thread.join(timeout=5)
+        for path in leftovers:
+            shutil.rmtree(path, ignore_errors=True)
+
+    def ready_count(self):
+        with self._cond:
+            return len(self._ready)
+
+    # ---------- background work ----------
+    def _loop(self):
+        failures = 0
+        retry_at = 0.0
+        while True:
+            with self._cond:
+                while self._running and not self._dispose and \
+                        (len(self._ready) >= self.size or time.monotonic() < retry_at):
+                    full = len(self._ready) >= self.size
+                    self._cond.wait(None if full else retry_at - time.monotonic())
+                if not self._running:
+                    return
+                need_fill = len(self._ready) < self.size and time.monotonic() >= retry_at
+                victim = None if need_fill or not self._dispose else self._dispose.popleft()
+            # refilling comes first: it is what the next launch waits on
+            if need_fill:
+                try:
+                    path = self._create()
+                except OSError:
+                    # staging keeps failing (disk full, unreadable template): back off, don't spin
+                    failures += 1
+                    retry_at = time.monotonic() + min(MAX_BACKOFF, 0.5 * 2 ** (failures - 1))
+                    continue
+                failures = 0
+                with self._cond:
+                    if self._running:
+                        self._ready.append(path)
+                        continue
+                shutil.rmtree(path, ignore_errors=True)
+            elif victim:
+                shutil.rmtree(victim, ignore_errors=True)
+
+    def _create(self):
+        path = tempfile.mkdtemp(prefix="session_", dir=self.root)
+        if self.template:
+            try:
+                self._stage(self.template, path)
+            except BaseException:
+                shutil.rmtree(path, ignore_errors=True)     # no half-staged leftovers
+                raise
+        return path
+
+    def _stage(self, src_root, dst_root):
+        for dirpath, dirnames, filenames in os.walk(src_root):
+            rel = os.path.relpath(dirpath, src_root)
+            target_dir = dst_root if rel == "." else os.path.join(dst_root, rel)
+            os.makedirs(target_dir, exist_ok=True)
+            for name in filenames:
+                src = os.path.join(dirpath, name)
+                dst = os.path.join(target_dir, name)
+                mode = os.lstat(src).st_mode
+                if stat.S_ISLNK(mode):
+                    os.symlink(os.readlink(src), dst)
+                elif stat.S_ISREG(mode):
+                    self._place_file(src, dst)
+                # FIFOs, sockets and devices are skipped: opening a FIFO would block staging
+
+    def _place_file(self, src, dst):
+        if self.link_mode == "hardlink":
+            try:
+                os.link(src, dst)
+                return
+            except OSError:
+                pass
+        if self.link_mode != "copy" and self._reflink_ok and self._reflink(src, dst):
+            return
+        shutil.copy2(src, dst)
+
+    def _reflink(self, src, dst):
+        try:
+            with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+                fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+            shutil.copystat(src, dst)
+            return True
+        except OSError as e:
+            if e.errno in (errno.EOPNOTSUPP, errno.ENOTTY, errno.EXDEV, errno.EINVAL, errno.ENOSYS):
+                # filesystem cannot clone: stop trying for this pool
+                self._reflink_ok = False
+            try:
+                os.remove(dst)
+            except OSError:
+                pass
+            return False
+
+
+_default_pool = None
+_default_pool_lock = threading.Lock()
+
+
+def default_pool():
+    """The process-wide pool under <tmp>/sandbox_env, shared by every Sandbox without its own."""
+    global _default_pool
+    with _default_pool_lock:
+        if _default_pool is None:
+            _default_pool = WorkspacePool(os.path.join(tempfile.gettempdir(), "sandbox_env"))
+        return _default_pool
@@ -0,0 +1,326 @@
+# sandbox/zygote.py
+"""
+Fork-server for fast launch of sandboxed Python scripts.
+
+A long-lived zygote interpreter imports a set of modules once, then forks a
+child per script; each child gets its own cwd, stdout/stderr pipes and limits
+and runs the script with runpy, skipping interpreter start-up and the preloaded
+imports. The parent talks to the zygote over a Unix socketpair and passes the
+pipe ends as file descriptors.
+
+POSIX only (needs fork and SCM_RIGHTS).
+"""
+import itertools
+import json
+import os
+import select
+import signal
+import socket
+import subprocess
+import sys
+import threading
+
+DEFAULT_PRELOAD = ("json", "re", "collections", "datetime", "pathlib", "subprocess", "threading", "argparse")
+MAX_MSG = 65536
+
+
+def _sock_type():
+    return getattr(socket, "SOCK_SEQPACKET", socket.SOCK_DGRAM) if sys.platform.startswith("linux") \
+        else socket.SOCK_DGRAM
+
+
+def _send(sock, msg, fds=()):
+    data = json.dumps(msg).encode()
+    if fds:
+        socket.send_fds(sock, [data], list(fds))
+    else:
+        sock.send(data)
+
+
+class ZygoteProcess:
+    """
+    Popen-like handle for a script forked by the zygote. The process is a child
+    of the zygote, not of us, so its exit status arrives as a message; poll()
+    and wait() read that instead of calling waitpid.
+    """
+    def __init__(self, pid, stdout, stderr):
+        self.pid = pid
+        self.stdout = stdout
+        self.stderr = stderr
+        self.returncode = None
+        self.rusage = None
+        self.launcher_maxrss = None     # the zygote's ru_maxrss at fork, inherited by the child
+        self._exited = threading.Event()
+
+    def _set_exit(self, returncode, rusage=None, launcher_maxrss=None):
+        self.returncode = returncode
+        self.rusage = rusage
+        self.launcher_maxrss = launcher_maxrss
+        self._exited.set()
+
+    def poll(self):
+        return self.returncode
+
+    def wait(self, timeout=None):
+        if not self._exited.wait(timeout):
+            raise subprocess.TimeoutExpired(f"zygote child {self.pid}", timeout)
+        return self.returncode
+
+    def send_signal(self, sig):
+        if self.returncode is None:
+            try:
+                os.kill(self.pid, sig)
+            except ProcessLookupError:
+                pass
+
+    def terminate(self):
+        self.send_signal(signal.SIGTERM)
+
+    def kill(self):
+        self.send_signal(signal.SIGKILL)
+
+
+class Zygote:
+    """
+    Client side of the fork-server. start() launches the zygote with the
+    `preload` modules imported; spawn() forks a script from it.
+    """
+    def __init__(self, preload=DEFAULT_PRELOAD, python=None):
+        self.preload = tuple(preload)
+        self.python = python or sys.executable
+        self.server = None
+        self._sock = None
+        self._ids = itertools.count(1)
+        self._pending = {}        # request id -> [Event, reply]
+        self._children = {}       # pid -> ZygoteProcess
+        self._early_exits = {}    # pid -> exit message that beat the spawn reply
+        self._lock = threading.Lock()
+        self._send_lock = threading.Lock()
+
+    @staticmethod
+    def supported():
+        return os.name == "posix" and hasattr(socket, "send_fds") and hasattr(os, "fork")
+
+    def start(self):
+        if self.server is not None and self.server.poll() is None:
+            return self
+        if not self.supported():
+            raise RuntimeError("The fork-server needs a POSIX system with fd passing")
+        ours, theirs = socket.socketpair(socket.AF_UNIX, _sock_type())
+        pkg_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        env = dict(os.environ)
+        env["PYTHONPATH"] = pkg_root + (os.pathsep + env["PYTHONPATH"] if env.get("PYTHONPATH") else "")
+        self.server = subprocess.Popen(
+            [self.python, "-m", "sandbox.zygote", str(theirs.fileno()), ",".join(self.preload)],
+            pass_fds=[theirs.fileno()], env=env, stdin=subprocess.DEVNULL)
+        theirs.close()
+        self._sock = ours
+        threading.Thread(target=self._reader, daemon=True, name="zygote-reader").start()
+        return self
+
+    def spawn(self, script, args=(), cwd=None, limits=None, cgroup=None, timeout=10.0):
+        """Fork `script` with argv [script, *args]; returns a ZygoteProcess."""
+        self.start()
+        out_r, out_w = os.pipe()
+        err_r, err_w = os.pipe()
+        req_id = next(self._ids)
+        waiter = [threading.Event(), None]
+        with self._lock:
+            self._pending[req_id] = waiter
+        msg = {"type": "spawn", "id": req_id, "script": os.path.abspath(script) if cwd is None else script,
+               "args": list(args), "cwd": cwd,
+               "limits": limits.as_dict() if limits is not None else None,
+               "cgroup": cgroup.path if cgroup is not None else None}
+        try:
+            with self._send_lock:
+                _send(self._sock, msg, [out_w, err_w])
+        finally:
+            os.close(out_w)
+            os.close(err_w)
+        if not waiter[0].wait(timeout) or waiter[1] is None or waiter[1].get("type") != "spawned":
+            os.close(out_r)
+            os.close(err_r)
+            with self._lock:
+                self._pending.pop(req_id, None)
+            error = waiter[1].get("error") if waiter[1] else "no reply from zygote"
+            raise RuntimeError(f"Zygote spawn failed: {error}")
+        proc = ZygoteProcess(waiter[1]["pid"], os.fdopen(out_r, "rb", buffering=0),
+                             os.fdopen(err_r, "rb", buffering=0))
+        with self._lock:
+            early = self._early_exits.pop(proc.pid, None)
+            if early is None:
+                self._children[proc.pid] = proc
+        if early is not None:
+            proc._set_exit(early["returncode"], early.get("rusage"), early.get("launcher_maxrss"))
+        return proc
+
+    def _reader(self):
+        while True:
+            try:
+                data = self._sock.recv(MAX_MSG)
+            except OSError:
+                data = b""
+            if not data:
+                break
+            msg = json.loads(data)
+            with self._lock:
+                if msg["type"] == "exit":
+                    proc = self._children.pop(msg["pid"], None)
+                    if proc is None:
+                        self._early_exits[msg["pid"]] = msg
+                else:
+                    proc = None
+                    waiter = self._pending.pop(msg.get("id"), None)
+                    if waiter:
+                        waiter[1] = msg
+                        waiter[0].set()
+            if proc is not None:
+                proc._set_exit(msg["returncode"], msg.get("rusage"), msg.get("launcher_maxrss"))
+        # zygote gone: nobody will report these exits any more
+        with self._lock:
+            orphans = list(self._children.values())
+            self._children.clear()
+            waiters = list(self._pending.values())
+            self._pending.clear()
+        for proc in orphans:
+            proc._set_exit(-1)
+        for waiter in waiters:
+            waiter[0].set()
+
+    def close(self):
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+        if self.server is not None:
+            try:
+                self.server.wait(2)
+            except subprocess.TimeoutExpired:
+                self.server.kill()
+                self.server.wait()
+            self.server = None
+
+
+# ---------- server side (runs inside the zygote process) ----------
+def _rusage_dict(ru):
+    return {"utime": ru.ru_utime, "stime": ru.ru_stime, "maxrss_kb": ru.ru_maxrss,
+            "minflt": ru.ru_minflt, "majflt": ru.ru_majflt, "nvcsw": ru.ru_nvcsw,
+            "nivcsw": ru.ru_nivcsw, "inblock": ru.ru_inblock, "oublock": ru.ru_oublock}
+
+
+def _run_child(sock, wake_fds, msg, fds):
+    # in the forked child: never return into the server loop
+    code = 1
+    try:
+        signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+        signal.set_wakeup_fd(-1)
+        sock.close()
+        for fd in wake_fds:
+            os.close(fd)
+        devnull = os.open(os.devnull, os.O_RDONLY)
+        os.dup2(devnull, 0)
+        os.dup2(fds[0], 1)
+        os.dup2(fds[1], 2)
+        for fd in [devnull] + list(fds):
+            os.close(fd)
+        if msg.get("cgroup"):
+            with open(os.path.join(msg["cgroup"], "cgroup.procs"), "w") as f:
+                f.write(str(os.getpid()))
+        if msg.get("limits"):
+            from sandbox.limits import ResourceLimits
+            ResourceLimits.from_dict(msg["limits"]).apply_in_child()
+        if msg.get("cwd"):
+            os.chdir(msg["cwd"])
+        import atexit
+        import runpy
+        atexit._clear()     # the zygote's own handlers are not the script's
+        sys.argv = [msg["script"]] + msg["args"]
+        sys.path[0] = os.path.dirname(os.path.abspath(msg["script"]))
+        try:
+            runpy.run_path(msg["script"], run_name="__main__")
+            code = 0
+        except SystemExit as e:
+            code = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+            if not isinstance(e.code, int) and e.code is not None:
+                print(e.code, file=sys.stderr)
+        except BaseException:
+            import traceback
+            traceback.print_exc()
+            code = 1
+        # what interpreter shutdown would do: join non-daemon threads, run atexit handlers
+        try:
+            threading._shutdown()
+        except BaseException:
+            pass
+        atexit._run_exitfuncs()
+    finally:
+        try:
+            sys.stdout.flush()
+            sys.stderr.flush()
+        finally:
+            os._exit(code)
+
+
+def serve(fd, preload):
+    import importlib
+    import resource
+    # what every child needs anyway
+    import runpy, traceback  # noqa: F401
+    from sandbox.limits import ResourceLimits  # noqa: F401
+    for name in preload:
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            pass
+    sock = socket.socket(fileno=fd)
+    wake_r, wake_w = os.pipe()
+    os.set_blocking(wake_r, False)
+    os.set_blocking(wake_w, False)
+    signal.set_wakeup_fd(wake_w)
+    signal.signal(signal.SIGCHLD, lambda *a: None)   # exits wake the select below
+    forked = {}     # pid -> our ru_maxrss when it was forked (its maxrss starts there)
+    while True:
+        try:
+            ready, _, _ = select.select([sock, wake_r], [], [])
+        except InterruptedError:
+            continue
+        if wake_r in ready:
+            try:
+                os.read(wake_r, 512)
+            except BlockingIOError:
+                pass
+        if sock in ready:
+            try:
+                data, fds, _, _ = socket.recv_fds(sock, MAX_MSG, 4)
+            except OSError:
+                data, fds = b"", []
+            if not data:
+                return      # parent went away
+            msg = json.loads(data)
+            maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            try:
+                pid = os.fork()
+            except OSError as e:
+                for f in fds:
+                    os.close(f)
+                _send(sock, {"type": "error", "id": msg["id"], "error": str(e)})
+                continue
+            if pid == 0:
+                _run_child(sock, (wake_r, wake_w), msg, fds)
+            for f in fds:
+                os.close(f)
+            forked[pid] = maxrss
+            _send(sock, {"type": "spawned", "id": msg["id"], "pid": pid})
+        # reap every child that has exited; rusage comes for free with wait4
+        while True:
+            try:
+                pid, status, ru = os.wait4(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid == 0:
+                break
+            _send(sock, {"type": "exit", "pid": pid, "returncode": os.waitstatus_to_exitcode(status),
+                         "rusage": _rusage_dict(ru), "launcher_maxrss": forked.pop(pid, None)})
+
+
+if __name__ == "__main__":
+    serve(int(sys.argv[1]), [m for m in sys.argv[2].split(",") if m] if len(sys.argv) > 2 else [])
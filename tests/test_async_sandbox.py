@@ -0,0 +1,63 @@
+# tests/test_async_sandbox.py
+import asyncio
+import os
+import sys
+
+import pytest
+
+from sandbox.async_sandbox import AsyncSandbox
+from sandbox.log_sink import LogBudget, LogRetention
+from sandbox.sandbox_core import CALLBACK_QUEUE_DEPTH, Sandbox
+
+pytestmark = pytest.mark.skipif(os.name == "nt", reason="POSIX commands")
+
+SLOW = f"{sys.executable} -c \"import time\nfor i in range(8): print(i, flush=True); time.sleep(0.1)\""
+
+
+def test_retention_keeps_live_async_logs(tmp_path):
+    sandbox = Sandbox(lambda line: None, reports_dir=str(tmp_path),
+                      retention=LogRetention(max_sessions=1), log_budget=LogBudget(max_lines=3))
+
+    async def go():
+        handle = await AsyncSandbox(sandbox).start(SLOW)
+        await asyncio.sleep(0.2)
+        threaded = sandbox.launch("echo threaded")
+        await asyncio.get_running_loop().run_in_executor(None, threaded.wait, 10)
+        await asyncio.sleep(0.2)
+        assert os.path.exists(handle.log_path)
+        assert await handle.wait(10) == 0
+        return handle
+
+    handle = asyncio.run(go())
+    assert [e["type"] for e in handle.session.events] == ["log_over_budget"]
+    assert handle.session.log_stats["over_budget"]
+
+
+def test_shell_commands_run_through_the_shell(tmp_path):
+    sandbox = Sandbox(lambda line: None, reports_dir=str(tmp_path))
+
+    async def go(command):
+        handle = await AsyncSandbox(sandbox).start(command)
+        lines = [line for batch in [b async for b in handle] for _, _, line in batch]
+        return lines, await handle.wait(10)
+
+    assert asyncio.run(go("echo a | tr a b")) == (["b"], 0)
+    assert asyncio.run(go("exit 3")) == ([], 3)
+    assert asyncio.run(go("echo plain")) == (["plain"], 0)
+
+
+def test_queue_depth_counts_batches_not_yet_taken(tmp_path):
+    sandbox = Sandbox(lambda line: None, reports_dir=str(tmp_path))
+
+    async def go():
+        base = CALLBACK_QUEUE_DEPTH.value(queue="async")
+        handle = await AsyncSandbox(sandbox).start("echo one")
+        await handle.wait(10)
+        queued = handle._queue.qsize() - 1      # the EOF sentinel is not a batch
+        assert queued > 0
+        assert CALLBACK_QUEUE_DEPTH.value(queue="async") - base == queued
+        async for _ in handle:
+            pass
+        assert CALLBACK_QUEUE_DEPTH.value(queue="async") == base
+
+    asyncio.run(go())
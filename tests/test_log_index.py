@@ -0,0 +1,46 @@
+# tests/test_log_index.py
+import sqlite3
+
+import pytest
+
+from utils.log_index import LogIndex
+
+
+def _fts5():
+    try:
+        sqlite3.connect(":memory:").execute("CREATE VIRTUAL TABLE t USING fts5(x)")
+        return True
+    except sqlite3.OperationalError:
+        return False
+
+
+pytestmark = pytest.mark.skipif(not _fts5(), reason="SQLite without FTS5")
+
+
+@pytest.fixture
+def index(tmp_path):
+    lines = [f"filler {n}" for n in range(1, 501)]
+    lines[149] = "alpha here"
+    lines[159] = "beta there"
+    lines[399] = "alpha and beta: error-42"
+    (tmp_path / "sandbox_log_20250101_000000.txt").write_text("\n".join(lines) + "\n")
+    index = LogIndex(str(tmp_path))
+    index.update()
+    yield index
+    index.close()
+
+
+def test_hits_report_the_matching_line(index):
+    assert [h["line"] for h in index.search("alpha")] == [150, 400]
+    assert [h["line"] for h in index.search("error-42")] == [400]
+
+
+def test_all_words_must_be_on_one_line(index):
+    assert [h["line"] for h in index.search("alpha beta")] == [400]
+    assert [h["line"] for h in index.search("here there")] == []
+
+
+def test_raw_queries_match_per_line(index):
+    assert [h["line"] for h in index.search("alpha OR beta", raw=True)] == [150, 160, 400]
+    with pytest.raises(ValueError):
+        index.search('"unbalanced', raw=True)
@@ -0,0 +1,74 @@
+# tests/test_log_sink.py
+import os
+
+import pytest
+
+from sandbox.log_sink import LogBudget, LogSink, session_log_files, open_log_file
+
+LINES = 100000
+BUDGETS = [{"max_bytes": 2000}, {"max_lines": 150}]
+
+
+def _write(path, **budget):
+    sink = LogSink(str(path), LogBudget(**budget))
+    for start in range(0, LINES, 1000):
+        sink.write_lines([f"line {n:06d}" for n in range(start, start + 1000)])
+    sink.close()
+    return sink
+
+
+def _read(path):
+    out = []
+    for name in session_log_files(str(path)):
+        f, _ = open_log_file(name)
+        with f:
+            out.extend(line.rstrip("\n") for line in f)
+    return out
+
+
+def _within(sink, budget, factor):
+    if "max_bytes" in budget:
+        return sink.bytes_written <= budget["max_bytes"] * factor
+    return sink.lines_written <= budget["max_lines"] * factor
+
+
+@pytest.mark.parametrize("budget", BUDGETS)
+def test_drop_middle_keeps_head_and_tail(tmp_path, budget):
+    path = tmp_path / "sandbox_log_20250101_000000.txt"
+    sink = _write(path, policy="drop_middle", **budget)
+    lines = _read(path)
+    assert lines[0] == "line 000000" and lines[-1] == f"line {LINES - 1:06d}"
+    assert any("omitted by the log budget" in line for line in lines)
+    assert sink.stats()["over_budget"]
+    assert sink.dropped_lines + sink.lines_written - 1 == LINES     # the marker is the extra line
+    assert _within(sink, budget, 1.1)
+
+
+@pytest.mark.parametrize("budget", BUDGETS)
+def test_sample_rate_drops_as_output_grows(tmp_path, budget):
+    path = tmp_path / "sandbox_log_20250101_000000.txt"
+    sink = _write(path, policy="sample", **budget)
+    lines = _read(path)
+    assert any("log budget reached again" in line for line in lines)
+    # the rate halves with every budget's worth, so the disk use grows only logarithmically
+    assert _within(sink, budget, 12)
+    assert sink.lines_written < LINES // 20
+
+
+@pytest.mark.parametrize("budget", BUDGETS)
+def test_backpressure_writes_everything_and_throttles(tmp_path, budget):
+    path = tmp_path / "sandbox_log_20250101_000000.txt"
+    sink = LogSink(str(path), LogBudget(policy="backpressure", backpressure_rate=1000, **budget))
+    sink.write_lines([f"line {n:06d}" for n in range(1000)])
+    assert sink.throttle() > 0
+    sink.close()
+    assert sink.lines_written == 1000 and sink.dropped_lines == 0
+    assert len(_read(path)) == 1000
+
+
+def test_rotation_keeps_segments_in_size(tmp_path):
+    path = tmp_path / "sandbox_log_20250101_000000.txt"
+    sink = _write(path, segment_bytes=64 * 1024, compress=False)
+    assert len(sink.segments) > 1
+    assert all(os.path.getsize(name) <= 64 * 1024 for name in sink.segments)
+    assert _read(path) == [f"line {n:06d}" for n in range(LINES)]
@@ -0,0 +1,26 @@
+# tests/test_spawn.py
+import os
+
+import pytest
+
+from sandbox.sandbox_core import Sandbox
+from sandbox.spawn import direct_argv
+
+pytestmark = pytest.mark.skipif(os.name == "nt", reason="commands go through the shell on Windows")
+
+
+def test_direct_argv_leaves_builtins_and_unknown_programs_to_the_shell():
+    for command in ("exit 3", "cd /tmp", "ulimit -n", "source env.sh", "no-such-program-here x"):
+        assert direct_argv(command) is None
+    assert direct_argv("ls -l") == ["ls", "-l"]
+
+
+def test_launch_runs_shell_builtins(tmp_path):
+    lines = []
+    sandbox = Sandbox(lines.append, reports_dir=str(tmp_path))
+    session = sandbox.launch("exit 3")
+    assert session.wait(10) == 3
+    assert session.status == "finished"
+    session = sandbox.launch("ulimit -n")
+    assert session.wait(10) == 0
+    assert any(line.isdigit() for line in lines)
@@ -0,0 +1,59 @@
+# tests/test_zygote.py
+import sys
+import textwrap
+
+import pytest
+
+from sandbox.sandbox_core import Sandbox
+from sandbox.zygote import Zygote
+
+pytestmark = pytest.mark.skipif(not Zygote.supported(), reason="the fork-server needs POSIX fd passing")
+
+SCRIPT = textwrap.dedent("""
+    import atexit, sys, threading, time
+    atexit.register(lambda: print("atexit ran", flush=True))
+    def work():
+        time.sleep(0.2)
+        print("thread done", flush=True)
+    threading.Thread(target=work).start()
+    print("main done", flush=True)
+    sys.exit(3)
+""")
+
+
+def _run(tmp_path, zygote):
+    lines = []
+    sandbox = Sandbox(lines.append, reports_dir=str(tmp_path / "reports"), zygote=zygote)
+    script = tmp_path / "script.py"
+    script.write_text(SCRIPT)
+    session = sandbox.execute(sandbox.new_session(f"{sys.executable} {script}"))
+    return [line for line in lines if not line.startswith("[")], session.returncode
+
+
+def test_zygote_matches_shell(tmp_path):
+    zygote = Zygote().start()
+    try:
+        forked = _run(tmp_path, zygote)
+    finally:
+        zygote.close()
+    assert forked == _run(tmp_path, None) == (["main done", "thread done", "atexit ran"], 3)
+
+
+def test_other_interpreters_are_not_forked(tmp_path):
+    sandbox = Sandbox(lambda line: None, reports_dir=str(tmp_path), zygote=Zygote())
+    assert sandbox._zygote_argv(f"{sys.executable} x.py") == [sys.executable, "x.py"]
+    assert sandbox._zygote_argv("python2.9 x.py") is None
+    assert sandbox._zygote_argv(f"{tmp_path}/python3 x.py") is None
+
+
+def test_inherited_rss_is_not_reported_as_the_childs(tmp_path):
+    script = tmp_path / "noop.py"
+    script.write_text("pass\n")
+    zygote = Zygote().start()
+    try:
+        sandbox = Sandbox(lambda line: None, reports_dir=str(tmp_path), zygote=zygote)
+        session = sandbox.execute(sandbox.new_session(f"{sys.executable} {script}"))
+    finally:
+        zygote.close()
+    assert session.process.launcher_maxrss
+    assert session.summary["max_rss_source"] != "wait4"
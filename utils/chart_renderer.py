@@ -0,0 +1,27 @@
+# utils/chart_renderer.py
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+
+def render_usage_chart(output_path, series, title="System Usage History", ylim=(0, 100),
+                       figsize=(6, 2), dpi=150):
+    """
+    Render [(label, timestamps, values), ...] to a PNG with the object-oriented
+    Agg API. No pyplot state is touched, so this is safe on a worker thread.
+    Timestamps are shown as seconds since the earliest sample.
+    """
+    fig = Figure(figsize=figsize, dpi=dpi)
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+    starts = [ts[0] for _, ts, _ in series if len(ts)]
+    t0 = min(starts) if starts else 0
+    for label, ts, values in series:
+        ax.plot([t - t0 for t in ts], values, label=label)
+    if ylim:
+        ax.set_ylim(*ylim)
+    ax.set_xlabel("seconds")
+    ax.set_title(title)
+    ax.legend()
+    fig.tight_layout()
+    fig.savefig(output_path)
+    return output_path
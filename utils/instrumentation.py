@@ -0,0 +1,279 @@
+# utils/instrumentation.py
+"""
+In-process metrics: counters, gauges and histograms kept in a Registry.
+The hot paths (launches, output pumping, monitor passes, exports) update the
+shared `metrics` registry; snapshot() returns the values as plain data and
+serve() exposes them on localhost in OpenMetrics text format (/metrics) and
+as JSON (/metrics.json) for local collectors.
+"""
+import bisect
+import contextlib
+import json
+import threading
+import time
+
+CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help="", labels=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labels)
+        self._values = {}           # (label values...) -> value
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name} takes labels {self.labelnames}, got {tuple(labels)}")
+        try:
+            return tuple(str(labels[n]) for n in self.labelnames)
+        except KeyError:
+            raise ValueError(f"{self.name} takes labels {self.labelnames}, got {tuple(labels)}") from None
+
+    def _items(self):
+        with self._lock:
+            return sorted(self._values.items())
+
+    def _labels(self, key):
+        return dict(zip(self.labelnames, key))
+
+
+class Counter(_Metric):
+    """Monotonic total (exposed with the OpenMetrics _total suffix)."""
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        if amount < 0:
+            raise ValueError("Counters only go up")
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+
+class Gauge(_Metric):
+    """Value that goes up and down; set_function() makes it computed at read time."""
+    kind = "gauge"
+
+    def __init__(self, name, help="", labels=()):
+        super().__init__(name, help, labels)
+        self._function = None
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set_function(self, fn):
+        """fn() -> value, called on every read (unlabelled gauges only)."""
+        self._function = fn
+
+    def value(self, **labels):
+        if self._function is not None:
+            return self._function()
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def _items(self):
+        if self._function is not None:
+            try:
+                return [((), self._function())]
+            except Exception:
+                return []
+        return super()._items()
+
+
+class Histogram(_Metric):
+    """Distribution of observed values over fixed upper bounds (seconds by default)."""
+    kind = "histogram"
+
+    def __init__(self, name, help="", labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # per-bucket (non-cumulative) counts, the last one is +Inf; then sum
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][i] += 1
+            state[1] += value
+
+    def time(self, **labels):
+        """Context manager / decorator observing the elapsed wall time."""
+        return _Timer(self, labels)
+
+    def _items(self):
+        with self._lock:
+            items = [(key, (list(counts), total)) for key, (counts, total) in self._values.items()]
+        out = []
+        for key, (counts, total) in sorted(items):
+            cumulative, running = [], 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                running += n
+                cumulative.append((bound, running))
+            out.append((key, {"count": running, "sum": total, "buckets": cumulative}))
+        return out
+
+
+class _Timer(contextlib.ContextDecorator):
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def _recreate_cm(self):
+        # as a decorator every call gets its own timer, so overlapping calls keep their own start
+        return _Timer(self.histogram, self.labels)
+
+    def __enter__(self):
+        self._t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self._t0, **self.labels)
+        return False
+
+
+def _num(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(int(value))
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labelstr(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{n}="{_escape(str(v))}"' for n, v in pairs) + "}"
+
+
+class Registry:
+    """Named metrics; asking for an existing name returns the same metric."""
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _get(self, cls, name, help, labels, **kwargs):
+        if cls is Counter and name.endswith("_total"):
+            name = name[:-len("_total")]
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, help, labels, **kwargs)
+            elif type(metric) is not cls or metric.labelnames != tuple(labels):
+                raise ValueError(f"Metric {name} already registered as a different {metric.kind}")
+            return metric
+
+    def counter(self, name, help="", labels=()):
+        return self._get(Counter, name, help, labels)
+
+    def gauge(self, name, help="", labels=()):
+        return self._get(Gauge, name, help, labels)
+
+    def histogram(self, name, help="", labels=(), buckets=DEFAULT_BUCKETS):
+        return self._get(Histogram, name, help, labels, buckets=buckets)
+
+    def get(self, name):
+        with self._lock:
+            return self._metrics.get(name)
+
+    def _sorted(self):
+        with self._lock:
+            return [self._metrics[name] for name in sorted(self._metrics)]
+
+    def snapshot(self):
+        """{name: {"type", "help", "samples": [{"labels": {...}, "value": v}, ...]}}; histogram
+        samples carry count, sum and cumulative buckets ({upper bound: count}) instead of value."""
+        out = {}
+        for metric in self._sorted():
+            samples = []
+            for key, value in metric._items():
+                sample = {"labels": metric._labels(key)}
+                if metric.kind == "histogram":
+                    sample.update(count=value["count"], sum=value["sum"],
+                                  buckets={_num(b): n for b, n in value["buckets"]})
+                else:
+                    sample["value"] = value
+                samples.append(sample)
+            out[metric.name] = {"type": metric.kind, "help": metric.help, "samples": samples}
+        return out
+
+    def render(self):
+        """All metrics in OpenMetrics text exposition format."""
+        lines = []
+        for metric in self._sorted():
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            if metric.help:
+                lines.append(f"# HELP {metric.name} {_escape(metric.help)}")
+            for key, value in metric._items():
+                if metric.kind == "counter":
+                    lines.append(f"{metric.name}_total{_labelstr(metric.labelnames, key)} {_num(value)}")
+                elif metric.kind == "gauge":
+                    lines.append(f"{metric.name}{_labelstr(metric.labelnames, key)} {_num(value)}")
+                else:
+                    for bound, n in value["buckets"]:
+                        lines.append(f"{metric.name}_bucket"
+                                     f"{_labelstr(metric.labelnames, key, [('le', _num(bound))])} {n}")
+                    lines.append(f"{metric.name}_count{_labelstr(metric.labelnames, key)} {value['count']}")
+                    lines.append(f"{metric.name}_sum{_labelstr(metric.labelnames, key)} {_num(value['sum'])}")
+        lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port=0, host="127.0.0.1"):
+        """
+        Start an HTTP endpoint on a daemon thread and return the server
+        (server.server_address has the bound port; shutdown() stops it).
+        Binds to localhost unless told otherwise.
+        """
+        # http.server (and the email package under it) is only loaded when serving
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                path = self.path.split("?", 1)[0]
+                if path in ("/metrics", "/"):
+                    body, ctype = registry.render().encode("utf-8"), CONTENT_TYPE
+                elif path == "/metrics.json":
+                    body, ctype = json.dumps(registry.snapshot()).encode("utf-8"), "application/json"
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", ctype)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass    # scrapes are not worth a line on stderr
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True, name="metrics-http").start()
+        return server
+
+
+metrics = Registry()
@@ -0,0 +1,292 @@
+# utils/log_index.py
+import argparse
+import datetime
+import gzip
+import json
+import os
+import re
+import sqlite3
+import sys
+import time
+
+# a session's live log (<stem>.txt) and its rotated segments (<stem>.partNNN.log[.gz])
+LOG_RE = re.compile(r"^(sandbox_log_(\d{8}_\d{6})(?:_\d+)?)\.(txt|part\d+\.log(?:\.gz)?)$")
+CHUNK_LINES = 200
+
+
+def fts_terms(text):
+    """Plain words -> an FTS5 query matching all of them, each quoted so `error:` or `foo-bar` are literal."""
+    return " ".join('"' + term.replace('"', '""') + '"' for term in text.split())
+
+
+def _parse_time(value):
+    """Accept a unix timestamp or 'YYYY-MM-DD[ HH:MM[:SS]]'."""
+    if value is None or isinstance(value, (int, float)):
+        return value
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    for fmt in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%d"):
+        try:
+            return datetime.datetime.strptime(value, fmt).timestamp()
+        except ValueError:
+            continue
+    raise ValueError(f"Unrecognised time: {value!r}")
+
+
+class LogIndex:
+    """
+    Full-text index over the session logs in reports/ (sandbox_log_*.txt and
+    their rotated .partNNN.log[.gz] segments) backed by SQLite FTS5.
+    update() only reads what changed since the last run: new files are indexed,
+    files that grew get their appended tail indexed, replaced (new inode),
+    rewritten or deleted files are refreshed. Session metadata (command, start time, exit status) comes from
+    the sandbox_log_*.json written next to each log, or the file name as fallback.
+    """
+    def __init__(self, reports_dir="reports", db_path=None):
+        self.reports_dir = reports_dir
+        self.db_path = db_path or os.path.join(reports_dir, "log_index.db")
+        os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+        self.db = sqlite3.connect(self.db_path)
+        self._create_schema()
+
+    def _create_schema(self):
+        try:
+            self.db.executescript("""
+                CREATE TABLE IF NOT EXISTS files (
+                    id INTEGER PRIMARY KEY,
+                    path TEXT UNIQUE,
+                    mtime REAL, size INTEGER, offset INTEGER, lines INTEGER,
+                    meta_mtime REAL,
+                    started REAL, command TEXT, exit_code INTEGER, status TEXT,
+                    inode INTEGER, session TEXT
+                );
+                CREATE VIRTUAL TABLE IF NOT EXISTS chunks USING fts5(
+                    body, file_id UNINDEXED, first_line UNINDEXED
+                );
+            """)
+        except sqlite3.OperationalError as e:
+            raise RuntimeError(f"SQLite FTS5 is not available: {e}")
+        # indexes created before segments were indexed lack these columns
+        columns = {row[1] for row in self.db.execute("PRAGMA table_info(files)")}
+        with self.db:
+            for column, kind in (("inode", "INTEGER"), ("session", "TEXT")):
+                if column not in columns:
+                    self.db.execute(f"ALTER TABLE files ADD COLUMN {column} {kind}")
+
+    def close(self):
+        self.db.close()
+
+    # ---------- indexing ----------
+    def update(self):
+        """Bring the index in line with reports/; returns (files_indexed, files_removed)."""
+        seen, indexed = set(), 0
+        names = os.listdir(self.reports_dir) if os.path.isdir(self.reports_dir) else []
+        with self.db:
+            for name in names:
+                m = LOG_RE.match(name)
+                if not m:
+                    continue
+                path = os.path.join(self.reports_dir, name)
+                seen.add(path)
+                session = os.path.join(self.reports_dir, m.group(1) + ".txt")
+                if self._index_file(path, m.group(2), session):
+                    indexed += 1
+            removed = 0
+            for file_id, path in self.db.execute("SELECT id, path FROM files").fetchall():
+                if path not in seen:
+                    self._forget(file_id)
+                    removed += 1
+        return indexed, removed
+
+    def _forget(self, file_id):
+        self.db.execute("DELETE FROM chunks WHERE file_id = ?", (file_id,))
+        self.db.execute("DELETE FROM files WHERE id = ?", (file_id,))
+
+    def _index_file(self, path, stamp, session):
+        try:
+            st = os.stat(path)
+        except OSError:
+            return False
+        meta_path = os.path.splitext(session)[0] + ".json"
+        meta_mtime = os.path.getmtime(meta_path) if os.path.exists(meta_path) else None
+        row = self.db.execute(
+            "SELECT id, mtime, size, offset, lines, meta_mtime, inode FROM files WHERE path = ?",
+            (path,)).fetchone()
+        same_file = row is not None and row[6] == st.st_ino
+        if same_file and row[1] == st.st_mtime and row[2] == st.st_size and row[5] == meta_mtime:
+            return False
+        meta = self._read_meta(meta_path, stamp)
+        # a rotated live log is a new file under the old name, so only the same inode can have
+        # grown; compressed segments never grow
+        if same_file and (st.st_size == row[2] if path.endswith(".gz") else st.st_size >= row[3]):
+            # grown (or only metadata changed): index the new tail
+            file_id, offset, lines = row[0], row[3], row[4]
+        else:
+            if row:
+                self._forget(row[0])
+            file_id = self.db.execute("INSERT INTO files (path) VALUES (?)", (path,)).lastrowid
+            offset, lines = 0, 0
+        offset, lines = self._index_tail(file_id, path, offset, lines)
+        self.db.execute(
+            "UPDATE files SET mtime=?, size=?, offset=?, lines=?, meta_mtime=?, started=?, command=?, "
+            "exit_code=?, status=?, inode=?, session=? WHERE id=?",
+            (st.st_mtime, st.st_size, offset, lines, meta_mtime, meta.get("started"), meta.get("command"),
+             meta.get("exit_code"), meta.get("status"), st.st_ino, session, file_id))
+        return True
+
+    @staticmethod
+    def _read_meta(meta_path, stamp):
+        meta = {}
+        try:
+            with open(meta_path, encoding="utf-8") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            pass
+        if not meta.get("started"):
+            meta["started"] = datetime.datetime.strptime(stamp, "%Y%m%d_%H%M%S").timestamp()
+        return meta
+
+    def _index_tail(self, file_id, path, offset, lines):
+        # only complete lines are indexed; a partial last line is picked up next time
+        # (offsets in a .gz segment count uncompressed bytes; segments never grow)
+        with (gzip.open(path, "rb") if path.endswith(".gz") else open(path, "rb")) as f:
+            f.seek(offset)
+            chunk = []
+            for raw in f:
+                if not raw.endswith(b"\n"):
+                    break
+                chunk.append(raw.decode("utf-8", "replace"))
+                offset += len(raw)
+                if len(chunk) >= CHUNK_LINES:
+                    self._add_chunk(file_id, lines, chunk)
+                    lines += len(chunk)
+                    chunk = []
+            if chunk:
+                self._add_chunk(file_id, lines, chunk)
+                lines += len(chunk)
+        return offset, lines
+
+    def _add_chunk(self, file_id, first_line, chunk):
+        self.db.execute("INSERT INTO chunks (body, file_id, first_line) VALUES (?, ?, ?)",
+                        ("".join(chunk), file_id, first_line + 1))
+
+    # ---------- queries ----------
+    def search(self, query, since=None, until=None, limit=20, raw=False):
+        """
+        Full-text search for lines containing all words of `query`; with raw=True
+        the query is FTS5 syntax (OR, NEAR, prefix*, ...) and a malformed one
+        raises ValueError. Either way a hit is a single line matching the whole
+        query. since/until filter on session start time and accept unix
+        timestamps or 'YYYY-MM-DD[ HH:MM]'. Returns a list of dicts with path,
+        started, command, exit_code, line (1-based, in that file) and snippet.
+        """
+        if not raw:
+            query = fts_terms(query)
+            if not query:
+                return []
+        sql = ("SELECT f.path, f.started, f.command, f.exit_code, f.status, c.first_line, c.body "
+               "FROM chunks c JOIN files f ON f.id = c.file_id WHERE chunks MATCH ?")
+        args = [query]
+        since, until = _parse_time(since), _parse_time(until)
+        if since is not None:
+            sql += " AND f.started >= ?"
+            args.append(since)
+        if until is not None:
+            sql += " AND f.started <= ?"
+            args.append(until)
+        sql += " ORDER BY rank LIMIT ? OFFSET ?"
+        # chunks are only candidates (the words may sit on different lines): take them in
+        # rank order until enough of their lines match on their own
+        hits, offset, batch = [], 0, max(limit, 50)
+        try:
+            while len(hits) < limit:
+                chunks = self.db.execute(sql, args + [batch, offset]).fetchall()
+                hits += self._line_hits(query, chunks)
+                if len(chunks) < batch:
+                    break
+                offset += batch
+        except sqlite3.OperationalError as e:
+            raise ValueError(f"Invalid search query {query!r}: {e}") from None
+        return hits[:limit]
+
+    def _line_hits(self, query, chunks):
+        # the candidate chunks' lines go into a private in-memory FTS5 table, so a line
+        # matches with exactly the tokenizer and query semantics of the index
+        with self.db:
+            self.db.execute("CREATE VIRTUAL TABLE IF NOT EXISTS temp.hit_lines "
+                            "USING fts5(body, chunk UNINDEXED, line UNINDEXED)")
+            self.db.execute("DELETE FROM temp.hit_lines")
+            self.db.executemany(
+                "INSERT INTO temp.hit_lines (body, chunk, line) VALUES (?, ?, ?)",
+                ((text, i, chunk[5] + n) for i, chunk in enumerate(chunks)
+                 for n, text in enumerate(chunk[6].rstrip("\n").split("\n"))))
+            rows = self.db.execute(
+                "SELECT chunk, line, snippet(hit_lines, 0, '[', ']', '...', 12) FROM temp.hit_lines "
+                "WHERE hit_lines MATCH ? ORDER BY chunk, line", (query,)).fetchall()
+        return [
+            {"path": chunks[i][0], "started": chunks[i][1], "command": chunks[i][2], "exit_code": chunks[i][3],
+             "status": chunks[i][4], "line": line, "snippet": snippet}
+            for i, line, snippet in rows
+        ]
+
+    def sessions(self, since=None, until=None):
+        """Indexed sessions in start order, optionally limited to a time range."""
+        since, until = _parse_time(since), _parse_time(until)
+        # one row per session: its live log and rotated segments together
+        rows = self.db.execute(
+            "SELECT COALESCE(session, path), started, command, exit_code, status, SUM(lines) FROM files "
+            "WHERE (? IS NULL OR started >= ?) AND (? IS NULL OR started <= ?) "
+            "GROUP BY COALESCE(session, path) ORDER BY started",
+            (since, since, until, until)).fetchall()
+        return [dict(zip(("path", "started", "command", "exit_code", "status", "lines"), r)) for r in rows]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m utils.log_index", description="Search sandbox session logs.")
+    parser.add_argument("--reports", default="reports", help="directory holding sandbox_log_*.txt")
+    parser.add_argument("--db", default=None, help="index file (default: <reports>/log_index.db)")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("index", help="update the index and exit")
+    sp = sub.add_parser("search", help="full-text search")
+    sp.add_argument("query")
+    sp.add_argument("--since")
+    sp.add_argument("--until")
+    sp.add_argument("--limit", type=int, default=20)
+    sp.add_argument("--raw", action="store_true", help="query is FTS5 syntax (OR, NEAR, prefix*) instead of plain words")
+    sp.add_argument("--no-update", action="store_true", help="search without refreshing the index first")
+    sp.add_argument("--json", action="store_true", help="print results as JSON lines")
+    args = parser.parse_args(argv)
+
+    index = LogIndex(args.reports, args.db)
+    try:
+        if args.cmd == "index" or not args.no_update:
+            t0 = time.perf_counter()
+            indexed, removed = index.update()
+            if args.cmd == "index":
+                print(f"indexed {indexed}, removed {removed} in {time.perf_counter() - t0:.3f}s")
+                return 0
+        t0 = time.perf_counter()
+        try:
+            hits = index.search(args.query, args.since, args.until, args.limit, raw=args.raw)
+        except ValueError as e:
+            print(f"error: {e}", file=sys.stderr)
+            return 2
+        for h in hits:
+            if args.json:
+                print(json.dumps(h))
+                continue
+            started = datetime.datetime.fromtimestamp(h["started"]).strftime("%Y-%m-%d %H:%M:%S") \
+                if h["started"] else "?"
+            print(f"{h['path']}:{h['line']}  [{started}] exit={h['exit_code']}  {h['command'] or ''}")
+            print(f"    {h['snippet']}")
+        if not args.json:
+            print(f"{len(hits)} hit(s) in {(time.perf_counter() - t0) * 1000:.1f} ms")
+    finally:
+        index.close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
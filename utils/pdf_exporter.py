@@ -3,17 +3,75 @@ from reportlab.lib.pagesizes import letter
 from reportlab.pdfgen import canvas
 from reportlab.lib.utils import ImageReader
 import datetime
+import io
 import os
+import textwrap
+import threading
 
-def export_report_pdf(output_pdf_path, metadata: dict, log_text: str, chart_img_path: str = None):
+from sandbox.log_sink import session_log_files, open_log_file
+from utils.instrumentation import metrics
+
+LOG_FONT = "Courier"
+LOG_FONT_SIZE = 8
+LOG_LEADING = 10
+READ_CHUNK = 1024 * 1024
+
+EXPORT_SECONDS = metrics.histogram("report_export_seconds", "Time spent producing a report, by stage", ("stage",),
+                                   buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0))
+EXPORTS = metrics.counter("report_exports", "Background report exports, by result", ("result",))
+
+
+def _iter_log_lines(log_text=None, log_path=None, progress=None):
+    """
+    Yield log lines from a session log on disk (its rotated segments first,
+    streamed, .gz decompressed on the fly) or from a string.
+    """
+    if log_path:
+        paths = session_log_files(log_path)
+        sizes = []
+        for path in paths:
+            try:
+                sizes.append(os.path.getsize(path))
+            except OSError:
+                sizes.append(0)
+        total = sum(sizes) or 1
+        base = 0
+        last_report = -1
+        for path, size in zip(paths, sizes):
+            try:
+                f, raw = open_log_file(path, READ_CHUNK)
+            except OSError:
+                continue    # pruned or renamed meanwhile
+            with f:
+                for line in f:
+                    if progress:
+                        pct = min(99, (base + raw.tell()) * 100 // total)
+                        if pct != last_report:
+                            last_report = pct
+                            progress(pct / 100.0)
+                    yield line.rstrip("\n")
+            base += size
+    elif log_text:
+        for line in io.StringIO(log_text):
+            yield line.rstrip("\n")
+
+
+@EXPORT_SECONDS.time(stage="pdf")
+def export_report_pdf(output_pdf_path, metadata: dict, log_text: str = None, chart_img_path: str = None,
+                      log_path: str = None, max_lines: int = None, progress_callback=None):
     """
-    Creates a simple PDF containing metadata, a log text block, and an optional chart image.
+    Creates a PDF containing metadata, an optional chart image and the session log.
     metadata: dict with keys like 'pid','cmd','started','priority','affinity'
-    log_text: full text
+    log_text: full text (used when no log_path is given)
     chart_img_path: optional PNG path (saved by matplotlib)
+    log_path: log file to stream from disk instead of log_text; read line by line,
+              so memory use does not depend on the log size
+    max_lines: optional budget of log lines to render; the rest is summarised
+    progress_callback: called with a 0..1 fraction while the log is rendered
+    Long lines are wrapped and the log continues over as many pages as needed.
     """
     os.makedirs(os.path.dirname(output_pdf_path) or ".", exist_ok=True)
-    c = canvas.Canvas(output_pdf_path, pagesize=letter)
+    c = canvas.Canvas(output_pdf_path, pagesize=letter, pageCompression=1)
     width, height = letter
     x_margin = 40
     y = height - 40
@@ -46,20 +104,73 @@ def export_report_pdf(output_pdf_path, metadata: dict, log_text: str, chart_img_
         except Exception:
             pass
 
-    # logs - wrap text
-    c.setFont("Courier", 8)
-    # ensure there's space
-    lines = log_text.splitlines()
-    # fit as many lines as possible on remaining page
-    max_lines = int((y - 40) / 10)
-    start_line = max(0, len(lines) - max_lines)
-    display_lines = lines[start_line:]
-    for line in display_lines:
+    # logs - wrapped to the printable width, paginated
+    wrap_cols = int((width - 2 * x_margin) / c.stringWidth("M", LOG_FONT, LOG_FONT_SIZE))
+    c.setFont(LOG_FONT, LOG_FONT_SIZE)
+    page = 1
+
+    def new_page():
+        nonlocal y, page
+        c.drawRightString(width - x_margin, 24, f"Page {page}")
+        c.showPage()
+        page += 1
+        y = height - 40
+        c.setFont(LOG_FONT, LOG_FONT_SIZE)
+
+    rendered = skipped = 0
+    for line in _iter_log_lines(log_text, log_path, progress_callback):
+        if max_lines is not None and rendered >= max_lines:
+            skipped += 1
+            continue
+        rendered += 1
+        for part in textwrap.wrap(line.expandtabs(4), wrap_cols, drop_whitespace=False) or [""]:
+            if y < 50:
+                new_page()
+            c.drawString(x_margin, y, part)
+            y -= LOG_LEADING
+    if skipped:
         if y < 50:
-            c.showPage()
-            y = height - 40
-            c.setFont("Courier", 8)
-        c.drawString(x_margin, y, line[:100])
-        y -= 10
+            new_page()
+        c.setFont("Helvetica-Oblique", 8)
+        c.drawString(x_margin, y, f"... {skipped} more log lines not included (line budget {max_lines}).")
+    c.drawRightString(width - x_margin, 24, f"Page {page}")
     c.save()
+    if progress_callback:
+        progress_callback(1.0)
     return output_pdf_path
+
+
+def export_report_pdf_async(output_pdf_path, metadata: dict, log_text: str = None, chart_img_path: str = None,
+                            log_path: str = None, max_lines: int = None, progress_callback=None,
+                            done_callback=None, chart_series=None):
+    """
+    Runs export_report_pdf on a background thread. done_callback(path, error)
+    is called from that thread when it finishes; error is None on success.
+    With chart_series ([(label, timestamps, values), ...]) the chart PNG is
+    rendered to chart_img_path on the same thread first.
+    """
+    def target():
+        nonlocal chart_img_path
+        if chart_series is not None and chart_img_path:
+            try:
+                from utils.chart_renderer import render_usage_chart
+                with EXPORT_SECONDS.time(stage="chart"):
+                    render_usage_chart(chart_img_path, chart_series)
+            except Exception:
+                chart_img_path = None   # report without the chart
+        try:
+            path = export_report_pdf(output_pdf_path, metadata, log_text, chart_img_path,
+                                     log_path=log_path, max_lines=max_lines,
+                                     progress_callback=progress_callback)
+        except Exception as ex:
+            EXPORTS.inc(result="error")
+            if done_callback:
+                done_callback(None, ex)
+            return
+        EXPORTS.inc(result="ok")
+        if done_callback:
+            done_callback(path, None)
+
+    th = threading.Thread(target=target, daemon=True)
+    th.start()
+    return th
@@ -0,0 +1,67 @@
+# utils/startup.py
+"""
+Startup timeline: named milestones measured from process creation, so the
+interpreter's own start-up is included. Import this module first thing in
+an entry point; mark() the milestones as they happen.
+"""
+import json
+import os
+import threading
+import time
+
+_T0 = time.perf_counter()
+_WALL0 = time.time()
+
+
+def _process_age():
+    # seconds between process creation and this module's import
+    try:
+        # Linux: both values count from boot, at clock-tick resolution
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+        with open("/proc/self/stat") as f:
+            start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        return max(0.0, uptime - start_ticks / os.sysconf("SC_CLK_TCK"))
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    try:
+        # elsewhere psutil's create_time; may be coarse (boot time in whole seconds)
+        import psutil
+        return max(0.0, _WALL0 - psutil.Process(os.getpid()).create_time())
+    except Exception:
+        return 0.0
+
+
+class StartupTimeline:
+    def __init__(self):
+        self._offset = _process_age()
+        self._marks = {"interpreter": self._offset}
+        self._lock = threading.Lock()
+
+    def elapsed(self):
+        """Seconds since the process was created."""
+        return self._offset + time.perf_counter() - _T0
+
+    def mark(self, name):
+        """Record a milestone once; later marks with the same name are ignored."""
+        with self._lock:
+            return self._marks.setdefault(name, self.elapsed())
+
+    def has(self, name):
+        with self._lock:
+            return name in self._marks
+
+    def as_dict(self):
+        """{milestone: milliseconds since process creation}, in the order reached."""
+        with self._lock:
+            return {name: round(t * 1000, 1) for name, t in self._marks.items()}
+
+    def summary(self):
+        return ", ".join(f"{name} {ms:.0f} ms" for name, ms in self.as_dict().items())
+
+    def save(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.as_dict(), f, indent=1)
+
+
+timeline = StartupTimeline()